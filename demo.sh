@@ -12,6 +12,9 @@ cd ..
 echo Creating database
 python manage.py migrate
 python manage.py loaddata fixtures/data.json
+python manage.py rebuildratings
+python manage.py rebuildsearch
+python manage.py rebuildcategories
 
 # collecting static files
 python manage.py collectstatic --no-input --link -v 0
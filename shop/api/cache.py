@@ -0,0 +1,221 @@
+"""
+This module contains shared cache of API responses.
+
+Responses are stored in `settings.API_CACHE_ALIAS` cache
+(cross-process: Redis or file-based, see settings)
+and are keyed by view, versions of resources the response depends on
+and fingerprint of query params.
+
+Resources:
+    `products`: any product in listings (catalog, popular, banners, etc.);
+    `product:<id>`: single product with its images, reviews and offers;
+    `taxonomy`: categories, tags and specifications;
+    `facets`: tags and specifications of active products,
+        its version is the version of facets index (see `catalog.facets`);
+    `order:<id>`: single order with its items;
+    `offers:<date>`: current prices and offers which last
+        until the next offer boundary on the date (see `catalog.prices`).
+
+Version of a resource is a unique token, changing it (`invalidate`)
+makes all responses depending on the resource unreachable.
+Resources are invalidated by `api.signals` after the transaction
+is committed (`invalidate_on_commit`), otherwise another worker could
+cache rows which are not committed yet under the new version.
+
+Expiration of responses is protected from cache stampede:
+    - only one worker recomputes missing or expired response
+      (lock is taken with atomic `cache.add`), others wait for it
+      or get the stale response;
+    - expired response is kept for `stale_timeout` more seconds
+      and served while it is being recomputed;
+    - response is recomputed a bit earlier than it expires with
+      probability growing as expiration comes closer and depending
+      on time of computation (XFetch algorithm), so usually
+      it is refreshed before anyone gets a miss.
+"""
+
+import hashlib
+import math
+import random
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from sitesettings.models import SiteSettings
+
+
+class ResponseCache:
+    """Versioned cache of response data with stampede protection"""
+    version_prefix = 'api-version'
+    data_prefix = 'api-response'
+    lock_prefix = 'api-lock'
+    timeout_key = 'api-cache-time'
+    default_timeout = 60 * 60 * 2
+    # seconds during which expired data is served while it is recomputed
+    stale_timeout = 60
+    # max seconds of recomputation, other workers wait for it no longer
+    lock_timeout = 10
+    wait_interval = 0.05
+    # the more the beta the earlier data is recomputed, 0 disables it
+    early_expiration_beta = 1.0
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_versions(self, resources) -> list[str]:
+        """
+        Return current versions of resources,
+        unknown resources get new versions
+        """
+        keys = [f'{self.version_prefix}:{resource}' for resource in resources]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                self.cache.add(key, str(time.time_ns()), None)
+                versions[key] = self.cache.get(key)
+        return [str(versions[key]) for key in keys]
+
+    def invalidate(self, *resources: str) -> None:
+        """Set new versions of resources"""
+        version = str(time.time_ns())
+        self.cache.set_many(
+            {
+                f'{self.version_prefix}:{resource}': version
+                for resource in resources
+            },
+            None,
+        )
+
+    def invalidate_on_commit(self, *resources: str) -> None:
+        """Set new versions of resources when the transaction is committed"""
+        transaction.on_commit(partial(self.invalidate, *resources))
+
+    def make_key(self, name: str, resources, params) -> str:
+        """
+        Return key of response of view `name` with given query params,
+        depending on given resources
+        """
+        fingerprint = hashlib.md5(
+            '&'.join(
+                f'{key}={value}' for key, value in sorted(params)
+            ).encode()
+        ).hexdigest()
+        versions = '.'.join(self.get_versions(resources))
+        return f'{self.data_prefix}:{name}:{versions}:{fingerprint}'
+
+    def get_timeout(self) -> int:
+        """Return cache time from site settings"""
+        timeout = self.cache.get(self.timeout_key)
+        if timeout is None:
+            timeout = (
+                SiteSettings.objects
+                .values_list('cache_time', flat=True)
+                .first()
+            ) or self.default_timeout
+            self.cache.set(self.timeout_key, timeout, None)
+        return timeout
+
+    def reset_timeout(self) -> None:
+        self.cache.delete(self.timeout_key)
+
+    def set(self, key: str, data, delta: float = 0.0) -> None:
+        """
+        Store data computed in `delta` seconds,
+        data becomes stale after cache time from site settings
+        """
+        timeout = self.get_timeout()
+        self.cache.set(
+            key,
+            (data, time.time() + timeout, delta),
+            timeout + self.stale_timeout,
+        )
+
+    def is_fresh(self, expires_at: float, delta: float) -> bool:
+        """
+        Return False if data is expired or is chosen to be recomputed
+        before expiration
+        """
+        early = (
+            delta * self.early_expiration_beta
+            * -math.log(1.0 - random.random())
+        )
+        return time.time() + early < expires_at
+
+    def get_or_set(self, key: str, compute):
+        """
+        Return cached data or data returned by `compute`
+        recomputed by single worker at a time,
+        None returned by `compute` is not cached
+        """
+        entry = self.cache.get(key)
+        if entry is not None and self.is_fresh(*entry[1:]):
+            return entry[0]
+
+        lock_key = f'{self.lock_prefix}:{key}'
+        if not self.cache.add(lock_key, 1, self.lock_timeout):
+            if entry is not None:
+                return entry[0]
+            entry = self.wait(key)
+            if entry is not None:
+                return entry[0]
+
+        try:
+            started = time.monotonic()
+            data = compute()
+            if data is not None:
+                self.set(key, data, time.monotonic() - started)
+            return data
+        finally:
+            self.cache.delete(lock_key)
+
+    def wait(self, key: str):
+        """Wait for entry recomputed by another worker"""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            if (entry := self.cache.get(key)) is not None:
+                return entry
+        return None
+
+
+response_cache = ResponseCache(settings.API_CACHE_ALIAS)
+
+
+class CachedResponseMixin:
+    """
+    Mixin for API views which caches data of successful GET responses
+    in `response_cache`, depending on resources from `get_cache_resources`
+    """
+    cache_resources: tuple[str, ...] = ()
+
+    def get_cache_resources(self) -> list[str]:
+        return list(self.cache_resources)
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        key = response_cache.make_key(
+            self.__class__.__name__,
+            self.get_cache_resources(),
+            [*request.query_params.lists(), *kwargs.items()],
+        )
+        response = None
+        get = super().get
+
+        def compute():
+            nonlocal response
+            response = get(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                return response.data
+            return None
+
+        data = response_cache.get_or_set(key, compute)
+        return response if response is not None else Response(data)
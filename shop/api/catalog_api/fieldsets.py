@@ -0,0 +1,36 @@
+"""
+This module contains sparse fieldsets of product endpoints.
+
+`?fields=id,title,price` query param selects fields of response items,
+querysets are pruned to fetch only data needed by selected fields
+(see `SparseFieldsMixin` and `ValuesSerializer`).
+"""
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+FIELDS_PARAM = 'fields'
+
+
+def get_requested_fields(request: Request, available) -> tuple[str, ...]:
+    """
+    Return fields passed in `fields` query param in order of available
+    fields, all available fields are returned if the param is not passed
+    """
+    param = request.query_params.get(FIELDS_PARAM)
+    if not param:
+        return tuple(available)
+
+    requested = {name.strip() for name in param.split(',') if name.strip()}
+    if unknown := requested.difference(available):
+        raise ValidationError(
+            {FIELDS_PARAM: [f'Unknown fields: {", ".join(sorted(unknown))}']}
+        )
+    return tuple(name for name in available if name in requested)
+
+
+def get_sources(fields, sources: dict[str, tuple[str, ...]]) -> list[str]:
+    """Return names of model fields needed by given fields of response"""
+    return list(dict.fromkeys(
+        source for field in fields for source in sources[field]
+    ))
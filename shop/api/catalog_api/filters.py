@@ -1,6 +1,7 @@
 import django_filters as filters
 
 from catalog.models import Product
+from catalog.search import search_products
 
 
 class ProductFilter(filters.FilterSet):
@@ -8,10 +9,14 @@ class ProductFilter(filters.FilterSet):
     Filterset for Product model
     Includes
         `freeDelivery`: filter by attribute freeDelivery
-        `title`: filter title of product with case-insensitive containment test
+        `filter`: full-text search by title, description, tags
+            and specifications of product (see `catalog.search`),
+            results are ordered by rank unless `sort` is passed
+        `title`: alias for `filter`
         `minPrice`: filter product price with greater than or equal to value
         `maxPrice`: filter product price with less than or equal to value
-        `available`: filter product stock with greater than zero
+        `available`: filter products with not reserved stock greater than zero
+        `category`: filter products of the category and its descendants
         `sort`: sorting queryset by product's
             price, creation date, amount of reviews, average rating
     """
@@ -23,11 +28,12 @@ class ProductFilter(filters.FilterSet):
         fields=(
             ('price', 'price'),
             ('created_at', 'created'),
-            ('_reviews', 'reviews'),
-            ('_purchases', 'rating')
+            ('reviews_count', 'reviews'),
+            ('rating_avg', 'rating')
         )
     )
-    title = filters.CharFilter(field_name='title', lookup_expr='icontains')
+    filter = filters.CharFilter(method='search')
+    title = filters.CharFilter(method='search')
     minPrice = filters.NumberFilter(field_name='price', lookup_expr='gte')
     maxPrice = filters.NumberFilter(field_name='price', lookup_expr='lte')
     available = filters.BooleanFilter(
@@ -36,15 +42,41 @@ class ProductFilter(filters.FilterSet):
     freeDelivery = filters.BooleanFilter(
         field_name='freeDelivery', method='check_delivery'
     )
+    category = filters.NumberFilter(method='filter_category')
+
+    def filter_queryset(self, queryset):
+        """Order search results by rank if other sorting is not chosen"""
+        queryset = super().filter_queryset(queryset)
+        if (
+            '_rank' in queryset.query.annotations
+            and not self.form.cleaned_data.get('sort')
+        ):
+            queryset = queryset.order_by('-_rank', *queryset.query.order_by)
+        return queryset
+
+    @classmethod
+    def search(cls, queryset, name, value):
+        """
+        Return products matching searched text
+        annotated with search rank as `_rank`
+        """
+        return search_products(queryset, value)
 
     @classmethod
     def check_availability(cls, queryset, name, value):
         """
-        Check if product stock is greater than zero
-        and return filtered queryset by this parameter
+        Check if product stock which is not reserved by unpaid orders
+        is greater than zero and return filtered queryset by this parameter
+        """
+        return queryset.with_available_stock().filter(_available__gt=0)
+
+    @classmethod
+    def filter_category(cls, queryset, name, value):
+        """
+        Return products of the category and all its descendants
+        (see `catalog.models.CategoryClosure`)
         """
-        lookup = '__'.join([name, 'gt'])
-        return queryset.filter(**{lookup: 0})
+        return queryset.in_category(int(value))
 
     @classmethod
     def check_delivery(cls, queryset, name, value):
@@ -1,12 +1,48 @@
+import base64
+import datetime
+import json
 from collections import OrderedDict
+from decimal import Decimal
 
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from api.cache import response_cache
+
+
+def cached_count(queryset: QuerySet) -> int:
+    """
+    Return amount of objects in queryset, the result is cached
+    by SQL of the queryset until any product is changed
+    """
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        # e.g. filtered by empty list of ids
+        return 0
+    key = response_cache.make_key(
+        'count', ['products', 'taxonomy'], [('sql', sql)]
+    )
+    return response_cache.get_or_set(key, queryset.count)
+
+
+class CachedCountPaginator(Paginator):
+    """Django paginator which takes amount of objects from cache"""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
 
 class CatalogPaginator(PageNumberPagination):
     """Custom paginator for catalog representation"""
     page_size = 8
+    django_paginator_class = CachedCountPaginator
 
     def get_paginated_response(self, data):
         """
@@ -24,3 +60,141 @@ class CatalogPaginator(PageNumberPagination):
                 ]
             )
         )
+
+
+class CatalogCursorPaginator(CatalogPaginator):
+    """
+    Keyset paginator for catalog representation,
+    used instead of `CatalogPaginator` if `cursor` query param is passed
+    (empty value means the first page).
+    Pages are positioned by values of ordering fields of the last item
+    with `pk` as tiebreak, so there are no OFFSET and no COUNT(*)
+    per request, amount of objects for `lastPage` is taken from cache.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = cached_count(queryset)
+        self.ordering = self.get_ordering(queryset)
+        self.current_page, position = self.decode_cursor(request)
+
+        if position is not None:
+            position = self.parse_position(queryset, position)
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        items = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.next_position = None
+        if len(items) > self.page_size:
+            items = items[:self.page_size]
+            self.next_position = [
+                self.get_value(items[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+
+        return items
+
+    def get_paginated_response(self, data):
+        """
+        Return response with ordered dict containing custom pagination info:
+        `currentPage`, `lastPage` and `nextCursor`
+        """
+        page_amount = -(-self.count // self.page_size)
+        next_cursor = None
+        if self.next_position is not None:
+            next_cursor = self.encode_cursor(
+                self.current_page + 1, self.next_position
+            )
+
+        return Response(
+            OrderedDict(
+                [
+                    ('items', data),
+                    ('currentPage', self.current_page),
+                    ('lastPage', page_amount),
+                    ('nextCursor', next_cursor),
+                ]
+            )
+        )
+
+    @classmethod
+    def get_ordering(cls, queryset: QuerySet) -> list[str]:
+        """Return ordering of the queryset with `pk` as the last field"""
+        ordering = [
+            field for field in
+            queryset.query.order_by or queryset.model._meta.ordering
+            if field.lstrip('-') not in ('pk', 'id')
+        ]
+        return [*ordering, 'pk']
+
+    @classmethod
+    def get_value(cls, item, name: str):
+        """Return value of field of model instance or `.values()` row"""
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+    def parse_position(self, queryset: QuerySet, position: list) -> list:
+        """
+        Return values of position converted to types of ordering fields,
+        values of wrong types make the cursor invalid
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            if name in queryset.query.annotations:
+                output_field = queryset.query.annotations[name].output_field
+            elif name == 'pk':
+                output_field = queryset.model._meta.pk
+            else:
+                output_field = queryset.model._meta.get_field(name)
+            try:
+                values.append(output_field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_position_filter(self, position: list) -> Q:
+        """
+        Return filter selecting rows that follow given position
+        in lexicographic order of ordering fields
+        """
+        position_filter = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            position_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        return position_filter
+
+    @classmethod
+    def encode_cursor(cls, page: int, position: list) -> str:
+        """Return url-safe string with page number and position"""
+        position = [
+            value.isoformat() if isinstance(value, datetime.datetime)
+            else str(value) if isinstance(value, Decimal)
+            else value
+            for value in position
+        ]
+        data = json.dumps([page, position]).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, request) -> tuple[int, list | None]:
+        """
+        Return page number and position from cursor query param,
+        position is None for the first page
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return 1, None
+
+        try:
+            page, position = json.loads(base64.urlsafe_b64decode(cursor))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return int(page), position
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,8 +1,11 @@
 import datetime
 
+from django.db.models import Manager, QuerySet
 from rest_framework import serializers
 
+from api.catalog_api.fieldsets import get_sources
 from catalog.models import Category, Product, ProductOffer, Review, Tag
+from catalog.prices import sale_prices
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -29,7 +32,73 @@ class TagSerializer(serializers.ModelSerializer):
         fields = 'id', 'name'
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class CurrentPriceField(serializers.DecimalField):
+    """
+    Current price of product with respect to offers lasting today,
+    sale prices of listed products are taken at once
+    by `ProductListSerializer` (see `catalog.prices`)
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            max_digits=100, decimal_places=2, source='*', read_only=True,
+            **kwargs,
+        )
+
+    def to_representation(self, product: Product):
+        prices = self.context.get('sale_prices')
+        if prices is None:
+            prices = sale_prices.resolve([product.pk])
+        return super().to_representation(prices.get(product.pk, product.price))
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """Serializer of lists of products resolving their sale prices at once"""
+
+    def to_representation(self, data):
+        products = list(data.all() if isinstance(data, Manager) else data)
+        if 'price' in self.child.fields:
+            self.context['sale_prices'] = sale_prices.resolve(
+                product.pk for product in products
+            )
+        return super().to_representation(products)
+
+
+class SparseFieldsMixin:
+    """
+    Mixin for model serializers which returns only fields passed
+    in context as `fields` (see `api.catalog_api.fieldsets`).
+    `Meta.sources` are model fields needed by each field
+    and `Meta.prefetches` are relations prefetched for it
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if (fields := self.context.get('fields')) is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def prune_queryset(cls, queryset: QuerySet, fields) -> QuerySet:
+        """Return queryset fetching only data needed by given fields"""
+        sources = get_sources(fields, cls.Meta.sources)
+        related = {
+            source.split('__')[0] for source in sources if '__' in source
+        }
+        prefetches = [
+            cls.Meta.prefetches[field]
+            for field in fields if field in cls.Meta.prefetches
+        ]
+        return (
+            queryset
+            .select_related(*related)
+            .prefetch_related(None)
+            .prefetch_related(*prefetches)
+            .only(*sources)
+        )
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     usages:
       api/products/{id}
@@ -58,7 +127,34 @@ class ProductSerializer(serializers.ModelSerializer):
         )
         optional_fields = ('category', 'count')
         depth = 1
-
+        list_serializer_class = ProductListSerializer
+        sources = {
+            'id': ('id',),
+            'category': ('category', 'category__id'),
+            'categoryName': ('category', 'category__title'),
+            'price': ('price',),
+            'stock': ('stock',),
+            'count': ('count',),
+            'date': ('created_at',),
+            'title': ('title',),
+            'description': ('fullDescription',),
+            'fullDescription': ('fullDescription',),
+            'href': ('id',),
+            'freeDelivery': ('freeDelivery',),
+            'rating': ('rating_avg',),
+            'images': ('id',),
+            'tags': ('id',),
+            'reviews': ('id',),
+            'specifications': ('id',),
+        }
+        prefetches = {
+            'images': 'images',
+            'tags': 'tags',
+            'reviews': 'reviews',
+            'specifications': 'specifications',
+        }
+
+    price = CurrentPriceField()
     rating = serializers.FloatField()
     categoryName = serializers.CharField(source='category.title')
     category = serializers.IntegerField(source='category.id')
@@ -86,12 +182,17 @@ class ProductShortSerializer(ProductSerializer):
 
     class Meta(ProductSerializer.Meta):
         optional_fields = ('tags',)
-
-    reviews = serializers.SerializerMethodField('get_reviews_amount')
-
-    @classmethod
-    def get_reviews_amount(cls, obj: Product):
-        return obj.reviews.count()
+        sources = {
+            **ProductSerializer.Meta.sources,
+            'reviews': ('reviews_count',),
+        }
+        prefetches = {
+            'images': 'images',
+            'tags': 'tags',
+            'specifications': 'specifications',
+        }
+
+    reviews = serializers.IntegerField(source='reviews_count')
 
 
 class OfferSerializer(serializers.ModelSerializer):
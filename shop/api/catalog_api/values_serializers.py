@@ -0,0 +1,233 @@
+"""
+This module contains read-only serializers of hot product listings
+(catalog, popular, limited, banners and sales).
+
+They build response data straight from `.values()` rows,
+images, tags and specifications of all rows are taken with
+one query each, so no model instances and no nested serializers
+are created. Output is the same as output of `ProductShortSerializer`
+and `OfferSerializer`.
+
+Prices of products are current prices with respect to offers
+lasting today (see `catalog.prices`).
+
+Sparse fieldsets are supported (see `api.catalog_api.fieldsets`):
+only values needed by selected fields are taken
+and relations of not selected fields are not queried.
+
+`CategoryTreeSerializer` builds the whole nested tree of active
+categories from two queries.
+"""
+
+from collections import defaultdict
+from operator import itemgetter
+
+from django.db.models import QuerySet
+from django.shortcuts import reverse
+from rest_framework import serializers
+
+from api.catalog_api.fieldsets import get_sources
+from api.catalog_api.serializers import ProductShortSerializer
+from catalog.models import Category, ProductImage, Specification, Tag
+from catalog.prices import sale_prices
+
+
+class ValuesSerializer:
+    """Base class of serializers of `.values()` rows"""
+    # names of values needed by each field of response items
+    sources: dict[str, tuple[str, ...]] = {}
+
+    @classmethod
+    def get_values(cls, queryset: QuerySet, fields=None) -> QuerySet:
+        """
+        Return queryset of rows with values needed by given fields
+        (all fields by default) and values of ordering fields
+        (they are needed by keyset paginator)
+        """
+        ordering = [
+            field.lstrip('-')
+            for field in queryset.query.order_by
+            or queryset.model._meta.ordering
+            if isinstance(field, str)
+        ]
+        names = dict.fromkeys((
+            *get_sources(fields or cls.sources, cls.sources),
+            *ordering,
+            'pk',
+        ))
+        return queryset.prefetch_related(None).values(*names)
+
+    @classmethod
+    def serialize(cls, rows: list[dict], fields=None) -> list[dict]:
+        """Return given fields (all fields by default) of rows"""
+        fields = fields or tuple(cls.sources)
+        representations = cls.get_representations(rows, fields)
+        getters = [(field, representations[field]) for field in fields]
+        return [
+            {field: get(row) for field, get in getters} for row in rows
+        ]
+
+    @classmethod
+    def get_representations(cls, rows: list[dict], fields) -> dict:
+        """Return functions returning value of each field from row"""
+        raise NotImplementedError
+
+    @classmethod
+    def get_images(cls, product_ids: list[int]) -> dict[int, list[str]]:
+        """Return urls of images of each product"""
+        storage = ProductImage._meta.get_field('image').storage
+        images = defaultdict(list)
+        for product_id, name in (
+            ProductImage.objects
+            .filter(product_id__in=product_ids)
+            .values_list('product_id', 'image')
+        ):
+            images[product_id].append(storage.url(name))
+        return images
+
+    @classmethod
+    def get_related(
+        cls, model, product_ids: list[int], fields: tuple[str, ...]
+    ) -> dict[int, list[dict]]:
+        """Return tags or specifications of each product"""
+        related = defaultdict(list)
+        for product_id, *values in (
+            model.objects
+            .filter(products__in=product_ids)
+            .values_list('products', *fields)
+        ):
+            related[product_id].append(dict(zip(fields, values)))
+        return related
+
+    @classmethod
+    def get_href(cls, product_id: int) -> str:
+        return reverse('frontend:product', kwargs={'pk': product_id})
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    """Serializer of listings of products, see `ProductShortSerializer`"""
+    sources = ProductShortSerializer.Meta.sources
+    price = serializers.DecimalField(max_digits=100, decimal_places=2)
+
+    @classmethod
+    def get_representations(cls, rows: list[dict], fields) -> dict:
+        price = cls.price.to_representation
+        representations = {
+            'id': itemgetter('id'),
+            'category': itemgetter('category'),
+            'categoryName': itemgetter('category__title'),
+            'stock': itemgetter('stock'),
+            'count': itemgetter('count'),
+            'date': itemgetter('created_at'),
+            'title': itemgetter('title'),
+            'description': lambda row: row['fullDescription'][:100] + '...',
+            'fullDescription': itemgetter('fullDescription'),
+            'href': lambda row: cls.get_href(row['id']),
+            'freeDelivery': itemgetter('freeDelivery'),
+            'rating': lambda row: round(row['rating_avg'], 2),
+            'reviews': itemgetter('reviews_count'),
+        }
+
+        product_ids = [row['pk'] for row in rows]
+        if 'price' in fields:
+            sale = sale_prices.resolve(product_ids)
+            representations['price'] = (
+                lambda row: price(sale.get(row['pk'], row['price']))
+            )
+        if 'images' in fields:
+            images = cls.get_images(product_ids)
+            representations['images'] = lambda row: images[row['pk']]
+        if 'tags' in fields:
+            tags = cls.get_related(Tag, product_ids, ('id', 'name'))
+            representations['tags'] = lambda row: tags[row['pk']]
+        if 'specifications' in fields:
+            specifications = cls.get_related(
+                Specification,
+                product_ids,
+                ('id', 'name', 'value', 'is_active'),
+            )
+            representations['specifications'] = (
+                lambda row: specifications[row['pk']]
+            )
+        return representations
+
+
+class OfferValuesSerializer(ValuesSerializer):
+    """Serializer of listings of offers, see `OfferSerializer`"""
+    sources = {
+        'id': ('product',),
+        'price': ('product__price',),
+        'salePrice': ('salePrice',),
+        'dateFrom': ('dateFrom',),
+        'dateTo': ('dateTo',),
+        'title': ('product__title',),
+        'href': ('product',),
+        'images': ('product',),
+    }
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    @classmethod
+    def get_representations(cls, rows: list[dict], fields) -> dict:
+        price = cls.price.to_representation
+        representations = {
+            'id': itemgetter('product'),
+            'price': lambda row: price(row['product__price']),
+            'salePrice': lambda row: price(row['salePrice']),
+            'dateFrom': lambda row: row['dateFrom'].isoformat(),
+            'dateTo': lambda row: row['dateTo'].isoformat(),
+            'title': itemgetter('product__title'),
+            'href': lambda row: cls.get_href(row['product']),
+        }
+        if 'images' in fields:
+            images = cls.get_images([row['product'] for row in rows])
+            representations['images'] = lambda row: images[row['product']]
+        return representations
+
+
+class CategoryTreeSerializer:
+    """
+    Serializer of nested tree of active categories, a category which
+    is a subcategory of several categories is placed under each of them
+    """
+
+    @classmethod
+    def serialize(cls, queryset: QuerySet[Category]) -> list[dict]:
+        storage = Category._meta.get_field('picture').storage
+        nodes = {
+            pk: {
+                'id': pk,
+                'title': title,
+                'image': {'src': storage.url(picture), 'alt': title},
+                'href': f'/catalog/{pk}',
+                'productsCount': products_count,
+            }
+            for pk, title, picture, products_count in queryset.values_list(
+                'pk', 'title', 'picture', 'products_count'
+            )
+        }
+        children = defaultdict(list)
+        for parent_id, child_id in (
+            Category.subcategories.through.objects
+            .filter(from_category__in=nodes, to_category__in=nodes)
+            .order_by('to_category')
+            .values_list('from_category', 'to_category')
+        ):
+            children[parent_id].append(child_id)
+
+        has_parent = {child for values in children.values() for child in values}
+        return [
+            cls.build(pk, nodes, children, set())
+            for pk in nodes if pk not in has_parent
+        ]
+
+    @classmethod
+    def build(cls, pk: int, nodes: dict, children: dict, path: set) -> dict:
+        """Return node with nested subcategories, cycles are cut"""
+        path = path | {pk}
+        return {
+            **nodes[pk],
+            'subcategories': [
+                cls.build(child, nodes, children, path)
+                for child in children[pk] if child not in path
+            ],
+        }
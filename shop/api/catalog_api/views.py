@@ -1,12 +1,12 @@
-from django.db.models import Avg, Count, Sum
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import status
 from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.cache import CachedResponseMixin, response_cache
+from api.catalog_api.fieldsets import get_requested_fields
 from api.catalog_api.filters import ProductFilter
-from api.catalog_api.paginators import CatalogPaginator
+from api.catalog_api.paginators import CatalogCursorPaginator, CatalogPaginator
 from api.catalog_api.serializers import (
     CategorySerializer,
     OfferSerializer,
@@ -15,41 +15,101 @@ from api.catalog_api.serializers import (
     ReviewSerializer,
     TagSerializer,
 )
+from api.catalog_api.values_serializers import (
+    CategoryTreeSerializer,
+    OfferValuesSerializer,
+    ProductValuesSerializer,
+)
+from catalog.facets import SPECIFICATION, TAG, facets
 from catalog.models import Category, Product, ProductOffer, Review, Tag
+from catalog.prices import sale_prices
+from catalog.suggest import suggestions
 
 
-class CachedListAPIView(ListAPIView):
-    """Abstract ListAPIView-based class with cached get-route"""
-    @method_decorator(cache_page(60))
-    def get(self, request, *args, **kwargs):
-        return self.list(request, *args, **kwargs)
+class CachedListAPIView(CachedResponseMixin, ListAPIView):
+    """
+    Abstract ListAPIView-based class with cached get-route,
+    responses are cached until any product or taxonomy is changed
+    """
+    cache_resources = ('products', 'taxonomy')
 
 
-class ProductDetail(RetrieveAPIView):
+class CurrentOffersMixin:
     """
-    GET api/products/{id}/
-    responses is cached for 60 sec
+    Mixin for cached views whose responses depend on offers lasting today,
+    responses are cached until the next offer boundary as well
     """
-    queryset = (
-        Product.objects
-        .filter(is_active=True)
-        .prefetch_related(
-            'reviews', 'tags', 'category', 'images', 'specifications'
+
+    def get_cache_resources(self) -> list[str]:
+        return [
+            *super().get_cache_resources(),
+            f'offers:{sale_prices.get_period()}',
+        ]
+
+
+class ValuesListMixin:
+    """
+    Mixin for read-only list views which serializes `.values()` rows
+    of the queryset with `values_serializer_class`
+    instead of serializing model instances with `serializer_class`
+    """
+    values_serializer_class = ProductValuesSerializer
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class
+        fields = get_requested_fields(request, serializer.sources)
+        queryset = serializer.get_values(
+            self.filter_queryset(self.get_queryset()), fields
         )
-    )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.serialize(page, fields)
+            )
+
+        return Response(serializer.serialize(list(queryset), fields))
+
+
+class ProductDetail(CurrentOffersMixin, CachedResponseMixin, RetrieveAPIView):
+    """
+    GET api/products/{id}/
+    responses is cached until the product or taxonomy is changed
+    or the next offer boundary comes,
+    fields of response can be selected with `fields` query param
+    """
+    queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
+    cache_resources = ('taxonomy',)
 
-    @method_decorator(cache_page(60))
-    def get(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+    def get_fields(self) -> tuple[str, ...]:
+        return get_requested_fields(
+            self.request, self.serializer_class.Meta.sources
+        )
 
+    def get_queryset(self):
+        return self.serializer_class.prune_queryset(
+            super().get_queryset(), self.get_fields()
+        )
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fields': self.get_fields()}
+
+    def get_cache_resources(self) -> list[str]:
+        return [
+            *super().get_cache_resources(),
+            'product:{}'.format(self.kwargs.get('pk')),
+        ]
 
-class ProductListCommon(CachedListAPIView):
+
+class ProductListCommon(
+    CurrentOffersMixin, ValuesListMixin, CachedListAPIView
+):
     """Abstract CachedListAPIView-based class"""
     serializer_class = ProductShortSerializer
 
     def get_queryset(self):
-        return Product.objects.filter(is_active=True)
+        return Product.objects.filter(is_active=True).with_listing_data()
 
 
 class ProductListLimited(ProductListCommon):
@@ -69,7 +129,28 @@ class ProductListPopular(ProductListCommon):
     """GET for api/products/popular/"""
     def get_queryset(self):
         qs = super().get_queryset()
-        return qs.alias(rating=Avg('reviews__rate')).order_by('-rating')[:8]
+        return qs.order_by('-rating_avg')[:8]
+
+
+class ProductSuggest(APIView):
+    """
+    GET for api/products/suggest/?q=<text>&limit=<amount>
+    products and tags are taken from in-memory index `catalog.suggest`
+    """
+    default_limit = 10
+    max_limit = 20
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+
+        if not text:
+            return Response({'products': [], 'tags': []})
+        return Response(suggestions.suggest(text, limit))
 
 
 class ReviewCreate(CreateAPIView):
@@ -105,31 +186,102 @@ class TagList(CachedListAPIView):
     """GET for api/tags/"""
     queryset = Tag.objects.filter(is_active=True)
     serializer_class = TagSerializer
+    cache_resources = ('taxonomy',)
 
 
-class CatalogList(CachedListAPIView):
+class CatalogList(CurrentOffersMixin, ValuesListMixin, CachedListAPIView):
     """
     GET for api/catalog/
     filter by fields in `api.catalog_api.filters.ProductFilter`
-    and filter by `tags[]` (this is frontend specific query)
+    and filter by facets: `tags[]` (this is frontend specific query)
+    and `specs[]` (see `get_facets`),
+    paginated with keyset pagination if `cursor` query param is passed
     """
     pagination_class = CatalogPaginator
+    cursor_pagination_class = CatalogCursorPaginator
     serializer_class = ProductShortSerializer
     filterset_class = ProductFilter
 
+    @property
+    def paginator(self):
+        """Return keyset paginator if `cursor` query param is passed"""
+        if not hasattr(self, '_paginator'):
+            cursor_param = self.cursor_pagination_class.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    cache_resources = ('products', 'taxonomy', 'facets')
+
     def get_queryset(self):
-        qs = (
-            Product.objects
-            .filter(is_active=True)
-            .annotate(_rating=Avg('reviews__rate'))
-            .annotate(_purchases=Sum('purchases__quantity'))
-            .annotate(_reviews=Count('reviews'))
-        ).order_by('-_purchases')
-        if tags := self.request.query_params.getlist('tags[]'):
-            qs = qs.filter(tags__name__in=tags)
+        qs = self.get_base_queryset()
+        condition = facets.get_filter(
+            self.get_facets(), self.get_facets_version()
+        )
+        if condition is not None:
+            qs = qs.filter(condition)
 
         return qs
 
+    def get_base_queryset(self):
+        """Return queryset of products without filtering by facets"""
+        return (
+            Product.objects
+            .filter(is_active=True)
+            .with_listing_data()
+        ).order_by('-purchases_count')
+
+    def get_facets(self) -> list[tuple]:
+        """
+        Return facets selected with `tags[]` (names of tags)
+        and `specs[]` (`<name>:<value>` of specifications) query params
+        (see `catalog.facets`)
+        """
+        params = self.request.query_params
+        selected = [(TAG, name) for name in params.getlist('tags[]')]
+        for spec in params.getlist('specs[]'):
+            name, _, value = spec.partition(':')
+            selected.append((SPECIFICATION, name, value))
+        return selected
+
+    def get_facets_version(self) -> str:
+        """Return version of facets index the response depends on"""
+        return response_cache.get_versions(['facets'])[0]
+
+
+class CatalogFacets(CatalogList):
+    """
+    GET for api/catalog/facets/
+    amounts of products of each tag and specification
+    for the same filters as api/catalog/ has,
+    a facet is counted together with selected facets of other groups
+    """
+    def list(self, request, *args, **kwargs):
+        product_ids = (
+            self.filter_queryset(self.get_base_queryset())
+            .order_by()
+            .values_list('pk', flat=True)
+        )
+        counts = facets.count(
+            product_ids, self.get_facets(), self.get_facets_version()
+        )
+        return Response(
+            {
+                'tags': [
+                    {'name': facet[1], 'count': count}
+                    for facet, count in sorted(counts.items())
+                    if facet[0] == TAG
+                ],
+                'specifications': [
+                    {'name': facet[1], 'value': facet[2], 'count': count}
+                    for facet, count in sorted(counts.items())
+                    if facet[0] == SPECIFICATION
+                ],
+            }
+        )
+
 
 class CategoryList(CachedListAPIView):
     """GET for api/categories/"""
@@ -139,13 +291,25 @@ class CategoryList(CachedListAPIView):
         .prefetch_related('subcategories')
     )
     serializer_class = CategorySerializer
+    cache_resources = ('taxonomy',)
 
 
-class OfferList(CachedListAPIView):
-    """GET for api/sales/"""
-    queryset = (
-        ProductOffer.objects
-        .filter(is_active=True)
-        .select_related('product')
-    )
+class CategoryTree(CachedListAPIView):
+    """
+    GET for api/categories/tree/
+    nested tree of active categories with amounts of active products
+    of each category and its descendants
+    """
+    queryset = Category.objects.filter(is_active=True)
+
+    def list(self, request, *args, **kwargs):
+        return Response(CategoryTreeSerializer.serialize(self.get_queryset()))
+
+
+class OfferList(CurrentOffersMixin, ValuesListMixin, CachedListAPIView):
+    """GET for api/sales/ - offers lasting today"""
     serializer_class = OfferSerializer
+    values_serializer_class = OfferValuesSerializer
+
+    def get_queryset(self):
+        return ProductOffer.objects.current().select_related('product')
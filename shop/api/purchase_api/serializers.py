@@ -24,7 +24,6 @@ class OrderSerializer(serializers.ModelSerializer):
             'city',
             'address',
             'products',
-            'totalCost',
         )
         depth = 1
 
@@ -36,6 +35,7 @@ class OrderSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='buyer.email')
 
     products = serializers.SerializerMethodField('get_products')
+    totalCost = serializers.ReadOnlyField(source='total_cost')
 
     @classmethod
     def get_order_id(cls, obj: Order):
@@ -51,16 +51,18 @@ class OrderSerializer(serializers.ModelSerializer):
     @classmethod
     def get_products(cls, obj: Order) -> list[dict]:
         """
-        Return list of dicts containing product data for each product in order
+        Return list of dicts containing product data for each product in order,
+        purchases with products and images should be prefetched
+        (see `purchase.models.OrderQuerySet.with_details`)
         """
         return [
             {
-                'href': pr.href,
-                'images': [i.image.url for i in pr.images.all()],
-                'title': pr.title,
-                'description': pr.description,
-                'price': obj.product_price(pr),
-                'count': obj.product_count(pr),
+                'href': item.product.href,
+                'images': [i.image.url for i in item.product.images.all()],
+                'title': item.product.title,
+                'description': item.product.description,
+                'price': item.price,
+                'count': item.quantity,
             }
-            for pr in obj.products.all()
+            for item in obj.purchases.all()
         ]
@@ -1,24 +1,215 @@
-from purchase.models import OrderItem
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Case, F, Q, When
+from django.db.transaction import atomic, set_rollback
+from django.utils import timezone
+
+from catalog.models import Product
+from common_mixins.signals import reserved_stock_changed
+from purchase.models import (
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    StockReservation,
+)
 
 
 def is_payment_valid(card_number: str):
     return card_number[-1] != '0' and int(card_number) % 2 == 0
 
 
-def check_stock_availability(purchases: list[OrderItem]):
+def get_required_stock(purchases: list[OrderItem]) -> dict[int, int]:
+    """Return total quantity of each product in purchases"""
+    required = {}
+    for purchase in purchases:
+        required[purchase.product_id] = (
+            required.get(purchase.product_id, 0) + purchase.quantity
+        )
+    return required
+
+
+def lock_stock(required: dict[int, int],
+               order_ids=()) -> tuple[dict[int, int], dict[int, int]]:
     """
-    Check if product stock more than quantity or equal to quantity
-    Return errors if not
+    Lock rows of required products in order of ids (so concurrent
+    payments and reservations wait for each other instead of deadlocks),
+    return stock of the products and quantities reserved
+    by live reservations of orders other than given ones
     """
-    errors = []
-    for purchase in purchases:
-        if purchase.product.stock < purchase.quantity:
-            errors.append(f'not enough {purchase.product.title}')
+    stock = dict(
+        Product.objects
+        .select_for_update()
+        .filter(pk__in=required)
+        .order_by('pk')
+        .values_list('pk', 'stock')
+    )
+    reserved = (
+        StockReservation.objects
+        .live()
+        .filter(product_id__in=required)
+        .exclude(order_id__in=order_ids)
+        .reserved_stock()
+    )
+    return stock, reserved
 
-    return errors
 
+def get_shortfalls(required: dict[int, int], stock: dict[int, int],
+                   reserved: dict[int, int]) -> dict[int, int]:
+    """Return amount of missing stock for each product without enough"""
+    shortfalls = {}
+    for pk, quantity in required.items():
+        available = stock.get(pk, 0) - reserved.get(pk, 0)
+        if available < quantity:
+            shortfalls[pk] = quantity - max(available, 0)
+    return shortfalls
 
-def reduce_product_stock_with_purchase_quantity(purchases: list[OrderItem]):
-    """"""
-    for purchase in purchases:
-        purchase.product.stock -= purchase.quantity
+
+def describe_shortfalls(shortfalls: dict[int, int],
+                        purchases: list[OrderItem]) -> dict:
+    """Return data of bad request response with details of shortfalls"""
+    required = get_required_stock(purchases)
+    titles = {p.product_id: p.product.title for p in purchases}
+    return {
+        'detail': [f'not enough {titles[pk]}' for pk in shortfalls],
+        'shortfalls': [
+            {
+                'id': pk,
+                'title': titles[pk],
+                'required': required[pk],
+                'missing': missing,
+            }
+            for pk, missing in shortfalls.items()
+        ],
+    }
+
+
+def reduce_stock(required: dict[int, int], order_ids=()) -> dict[int, int]:
+    """
+    Reduce stock of products by required quantities with single UPDATE
+    if ALL products have enough stock which is not reserved
+    for orders other than given ones, otherwise reduce nothing.
+    Return amount of missing stock for each product which doesn't have enough.
+
+    Every row is updated only if its stock is still enough
+    (for databases without row locks)
+    """
+    if not required:
+        return {}
+
+    while True:
+        with atomic():
+            stock, reserved = lock_stock(required, order_ids)
+            if shortfalls := get_shortfalls(required, stock, reserved):
+                return shortfalls
+
+            enough = Q()
+            for pk, quantity in required.items():
+                enough |= Q(pk=pk, stock__gte=quantity + reserved.get(pk, 0))
+            updated = Product.objects.filter(enough).update(
+                stock=Case(
+                    *(
+                        When(pk=pk, then=F('stock') - quantity)
+                        for pk, quantity in required.items()
+                    ),
+                    default=F('stock'),
+                )
+            )
+            if updated == len(required):
+                # reserved stock is not needed anymore
+                (
+                    StockReservation.objects
+                    .filter(order_id__in=order_ids)
+                    .delete()
+                )
+                return {}
+
+            # stock was changed by concurrent payment, check it again
+            set_rollback(True)
+
+
+@atomic
+def reserve_stock(order: Order, purchases: list[OrderItem]) -> dict[int, int]:
+    """
+    Reserve stock of products for purchases of the order
+    for `settings.STOCK_RESERVATION_TTL` seconds
+    if ALL products have enough stock which is not reserved yet,
+    otherwise reserve nothing.
+    Return amount of missing stock for each product which doesn't have enough
+    """
+    required = get_required_stock(purchases)
+    stock, reserved = lock_stock(required, [order.pk])
+    if shortfalls := get_shortfalls(required, stock, reserved):
+        return shortfalls
+
+    expires_at = timezone.now() + timedelta(
+        seconds=settings.STOCK_RESERVATION_TTL
+    )
+    StockReservation.objects.filter(order=order).delete()
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order=order,
+            product_id=pk,
+            quantity=quantity,
+            expires_at=expires_at,
+        )
+        for pk, quantity in required.items()
+    )
+
+    if sold_out := [
+        pk for pk, quantity in required.items()
+        if stock[pk] - reserved.get(pk, 0) == quantity
+    ]:
+        reserved_stock_changed.send(
+            sender=StockReservation, product_ids=sold_out
+        )
+    return {}
+
+
+def claim_idempotency_key(user, key: str) -> tuple[IdempotencyKey, bool]:
+    """
+    Return record of idempotency key of the user and True if the key
+    is new or abandoned, so the request should be processed and its
+    response stored, the new record is committed at once,
+    so concurrent requests see it
+    """
+    try:
+        with atomic():
+            record, created = IdempotencyKey.objects.get_or_create(
+                user=user, key=key
+            )
+    except IntegrityError:
+        # the same key was claimed by concurrent request
+        record, created = IdempotencyKey.objects.get(user=user, key=key), False
+    if created or record.is_completed:
+        return record, created
+
+    # worker of abandoned request is supposed to be dead, the key is
+    # taken over by conditional UPDATE, so only one request gets it
+    claimed_at = timezone.now()
+    if IdempotencyKey.objects.abandoned().filter(
+        pk=record.pk, created_at=record.created_at
+    ).update(created_at=claimed_at):
+        record.created_at = claimed_at
+        return record, True
+    return record, False
+
+
+def wait_for_idempotency_key(record: IdempotencyKey, timeout: float,
+                             interval: float = 0.1) -> IdempotencyKey | None:
+    """
+    Wait until request with the key is completed by another worker,
+    return completed record or None if it wasn't completed in time
+    or was released because of error
+    """
+    deadline = time.monotonic() + timeout
+    while not record.is_completed:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(interval)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
@@ -2,43 +2,84 @@ from django.contrib import messages
 from django.db.models import QuerySet
 from django.db.transaction import atomic
 from django.shortcuts import get_object_or_404, redirect, reverse
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import status
-from rest_framework.generics import GenericAPIView, ListCreateAPIView
-from rest_framework.mixins import RetrieveModelMixin
+from rest_framework.generics import (
+    GenericAPIView,
+    ListCreateAPIView,
+    RetrieveAPIView,
+)
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.cache import CachedResponseMixin, response_cache
 from api.catalog_api.serializers import ProductShortSerializer
 from api.purchase_api.serializers import OrderSerializer
 from api.purchase_api.service import (
+    claim_idempotency_key,
+    describe_shortfalls,
+    get_required_stock,
     is_payment_valid,
-    check_stock_availability,
-    reduce_product_stock_with_purchase_quantity
+    reduce_stock,
+    reserve_stock,
+    wait_for_idempotency_key,
 )
 from catalog.models import Product
+from catalog.prices import sale_prices
 from purchase.cart import Cart
-from purchase.models import DeliveryType, Order, OrderItem
+from purchase.models import DeliveryType, IdempotencyKey, Order, OrderItem
 
 
 class PaymentView(APIView):
-    """POST for api/payment/"""
-    @atomic
+    """
+    POST for api/payment/
+    requests repeated with the same `Idempotency-Key` header
+    get the stored response of the first request instead of paying again
+    """
+    idempotency_header = 'Idempotency-Key'
+    # seconds to wait for concurrent request with the same key
+    idempotency_wait = 5
+
     def post(self, request: Request, *args, **kwargs) -> Response:
+        key = request.headers.get(self.idempotency_header)
+        if not key or not request.user.is_authenticated:
+            return self.pay(request)
+
+        record, created = claim_idempotency_key(request.user, key)
+        if not created:
+            record = wait_for_idempotency_key(record, self.idempotency_wait)
+            if record is None:
+                return Response(
+                    {'detail': 'request with this key is in progress'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(record.response, status=record.status_code)
+
+        try:
+            return self.pay(request, record)
+        except Exception:
+            # the key is released, so the request could be retried
+            record.delete()
+            raise
+
+    @atomic
+    def pay(self, request: Request,
+            record: IdempotencyKey | None = None) -> Response:
         """
-        Check product stock for all orders,
-        check user's card and finish payment
+        Check user's card, reduce product stock for all orders
+        and finish payment, the response is stored within the same
+        transaction in the record of idempotency key if it is passed
         """
+        response = self.process_payment(request)
+        if record is not None:
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response'])
+        return response
+
+    def process_payment(self, request: Request) -> Response:
+        """Pay all orders of user awaiting payment"""
         data = self.request.data
-
-        # getting orders of request user which status is `awaiting payment`
-        orders_for_pay = (
-            Order.objects
-            .prefetch_related('purchases')
-            .filter(buyer=self.request.user.profile, status='awaiting payment')
-        )
         card_number = data.get('number')
 
         # check if card number is valid, return bad request if not
@@ -48,30 +89,47 @@ class PaymentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # lock orders of request user which status is `awaiting payment`,
+        # so the same order can't be paid twice
+        order_ids = list(
+            Order.objects
+            .select_for_update()
+            .filter(buyer=self.request.user.profile, status='awaiting payment')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
         # get all purchases in orders for pay
         # (it could be better to split purchases for each order)
         purchases = (
             OrderItem.objects
-            .prefetch_related('product')
-            .filter(order__in=orders_for_pay).all()
+            .select_related('product')
+            .filter(order_id__in=order_ids)
         )
-        # check for stock availability of all products in purchases
-        if errors := check_stock_availability(purchases) is False:
-            # if ALL products have enough stock reduce it
-            # with quantity in purchase
-            reduce_product_stock_with_purchase_quantity(purchases)
+        required = get_required_stock(purchases)
 
-            # change order statuses to `paid`
-            orders_for_pay.update(status='paid')
+        # reduce stock if ALL products have enough stock,
+        # reservations of the orders are released
+        if shortfalls := reduce_stock(required, order_ids):
+            # if any of products doesn't have enough stock
+            # return bad request with details
+            return Response(
+                describe_shortfalls(shortfalls, purchases),
+                status.HTTP_400_BAD_REQUEST,
+            )
 
-            # delete all records from cart
-            self.request.cart.clear()
+        # change order statuses to `paid`
+        Order.objects.filter(pk__in=order_ids).update(status='paid')
+        response_cache.invalidate_on_commit(
+            'products',
+            *(f'product:{pk}' for pk in required),
+            *(f'order:{pk}' for pk in order_ids),
+        )
 
-            return Response(status=status.HTTP_200_OK)
+        # delete all records from cart
+        self.request.cart.clear()
 
-        # if any of products doesn't have enough stock return bad request
-        # with details
-        return Response({'detail': errors}, status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_200_OK)
 
 
 class OrderActiveView(APIView):
@@ -83,22 +141,30 @@ class OrderActiveView(APIView):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         user = self.request.user.profile
-        active_order = get_object_or_404(Order, buyer=user, status='accepted')
+        active_order = get_object_or_404(
+            Order.objects.with_details(), buyer=user, status='accepted'
+        )
         serializer = self.serializer_class(active_order)
         return Response(serializer.data)
 
 
-class OrderRetrieveConfirmView(RetrieveModelMixin, GenericAPIView):
-    """GET and POST for api/orders/{id}/"""
+class OrderRetrieveConfirmView(CachedResponseMixin, RetrieveAPIView):
+    """
+    GET and POST for api/orders/{id}/
+    responses of GET are cached until the order is changed
+    """
     serializer_class = OrderSerializer
-    queryset = Order.objects.filter(is_active=True)
+    queryset = Order.objects.filter(is_active=True).with_details()
 
-    @method_decorator(cache_page(60 * 60 * 2))
-    def get(self, request: Request, *args, **kwargs) -> Response:
-        return self.retrieve(request, *args, **kwargs)
+    def get_cache_resources(self) -> list[str]:
+        return ['order:{}'.format(self.kwargs.get('pk'))]
 
+    @atomic
     def post(self, request: Request, *args, **kwargs) -> Response:
-        """"""
+        """
+        Confirm accepted order of user and reserve stock for it
+        until payment (see `api.purchase_api.service.reserve_stock`)
+        """
         data = self.request.data
         user = self.request.user.profile
 
@@ -106,6 +172,13 @@ class OrderRetrieveConfirmView(RetrieveModelMixin, GenericAPIView):
             buyer=user, status='accepted'
         )
 
+        purchases = order.purchases.select_related('product')
+        if shortfalls := reserve_stock(order, purchases):
+            return Response(
+                describe_shortfalls(shortfalls, purchases),
+                status.HTTP_400_BAD_REQUEST,
+            )
+
         order.status = 'awaiting payment'
         order.address = data.get('address', '')
         order.city = data.get('city', '')
@@ -126,33 +199,45 @@ class OrderListCreateView(ListCreateAPIView):
         return (
             Order.objects
             .filter(buyer=self.request.user.profile)
+            .with_details()
             .order_by('-createdAt')
         )
 
+    @atomic
     def post(self, request: Request, *args, **kwargs) -> Response:
-        """Create temp Order which would be finished in future"""
+        """
+        Create temp Order which would be finished in future,
+        prices of products are taken from database
+        with respect to active offers, not from request
+        """
         if not request.user.is_authenticated:
             messages.error(request, 'Вам необходимо войти в свой аккаунт')
             return redirect(reverse('frontend:signin'))
 
         data = self.request.data
-
-        data_ids = [d['id'] for d in data.values()]
-        products = Product.objects.filter(id__in=data_ids)
+        quantities = {int(d['id']): int(d['count']) for d in data.values()}
 
         order, created = Order.objects.get_or_create(
             buyer=self.request.user.profile, status='accepted'
         )
         if created:
             self.request.cart.clear()
-            for pr in products:
-                pr_id = str(pr.id)
-                OrderItem.objects.create(
+            products = Product.objects.filter(id__in=quantities)
+            prices = sale_prices.resolve(quantities)
+            OrderItem.objects.bulk_create(
+                OrderItem(
                     order=order,
                     product=pr,
-                    quantity=data[pr_id]['count'],
-                    price=data[pr_id]['price'],
+                    quantity=quantities[pr.pk],
+                    price=prices.get(pr.pk, pr.price),
                 )
+                for pr in products
+            )
+            # bulk_create doesn't send signals updating costs
+            # and amounts of purchases
+            Order.objects.filter(pk=order.pk).update_costs()
+            Product.objects.add_purchases(quantities)
+        order = self.get_queryset().get(pk=order.pk)
         serializer = self.get_serializer(order)
         return Response(serializer.data)
 
@@ -161,13 +246,8 @@ class BasketView(GenericAPIView):
     """GET, POST and DELETE for api/basket/"""
     serializer_class = ProductShortSerializer
 
-    def __init__(self):
-        super().__init__()
-        self.cart = self.request.cart
-
     def get_queryset(self) -> QuerySet[Product]:
-        cart = self.get_cart()
-        return Product.objects.filter(id__in=cart.products.keys())
+        return self.get_cart().get_products()
 
     def get(self, request: Request, *args, **kwargs) -> Response:
         return self.get_response()
@@ -201,3 +281,10 @@ class BasketView(GenericAPIView):
         cart = self.get_cart()
         serializer = self.get_serializer(cart, many=True)
         return Response(serializer.data)
+
+
+class BasketSummaryView(APIView):
+    """GET for api/basket/summary/"""
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        return Response(request.cart.get_summary())
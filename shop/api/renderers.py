@@ -0,0 +1,104 @@
+"""
+This module contains fast JSON renderer of API responses.
+
+`orjson` is used if it is installed, otherwise rendering falls back
+to DRF `JSONRenderer`. Values which `orjson` doesn't encode natively
+(decimals, dates, lazy strings, etc.) are encoded by DRF encoder,
+so the output is the same as output of `JSONRenderer`.
+
+`orjson` formats floats in exponent notation differently (`1e-7`, `1e16`
+and `0.00001` instead of `1e-07`, `1e+16` and `1e-05`) and renders
+non-finite floats (NaN, Infinity) as null while `JSONRenderer` raises,
+so responses with such floats or decimals are rendered by `JSONRenderer`.
+"""
+
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# absolute values of floats which both `orjson` and `json` format
+# without exponent (and so equally)
+MIN_PLAIN_FLOAT = 1e-4
+MAX_PLAIN_FLOAT = 1e16
+# types of the most frequent values, which are skipped at once
+# (decimals are checked when they are encoded)
+NOT_FLOATS = frozenset((str, int, bool, type(None), Decimal))
+
+
+def is_special_float(value: float) -> bool:
+    """Return whether `orjson` and `json` format the float differently"""
+    return bool(value) and not MIN_PLAIN_FLOAT <= abs(value) < MAX_PLAIN_FLOAT
+
+
+def has_special_floats(data) -> bool:
+    """
+    Return whether dict, list or tuple has (at any depth) floats
+    which `orjson` and `json` format differently
+    """
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        for value in obj.values() if isinstance(obj, dict) else obj:
+            if type(value) in NOT_FLOATS:
+                continue
+            if isinstance(value, float):
+                if is_special_float(value):
+                    return True
+            elif isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer using `orjson`, pretty printed responses
+    (`indent` param), data which `orjson` can't encode
+    (e.g. integers out of 64 bits) or formats differently
+    are rendered by `JSONRenderer`
+    """
+    if orjson is not None:
+        # dates are passed to DRF encoder to keep its format (`Z` for UTC)
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+
+        def default(obj):
+            # decimals are encoded as floats, so they are checked here
+            value = encoder.default(obj)
+            if isinstance(value, float):
+                if is_special_float(value):
+                    raise ValueError(obj)
+            elif isinstance(value, (dict, list, tuple)):
+                if has_special_floats(value):
+                    raise ValueError(obj)
+            return value
+
+        if has_special_floats([data]):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # escape line and paragraph separators as `JSONRenderer` does
+        return (
+            ret
+            .replace(b'\xe2\x80\xa8', b'\\u2028')
+            .replace(b'\xe2\x80\xa9', b'\\u2029')
+        )
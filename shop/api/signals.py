@@ -0,0 +1,108 @@
+"""
+This module contains signal receivers which invalidate
+resources of cached API responses (see `api.cache`)
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import response_cache
+from catalog.models import (
+    Category,
+    Product,
+    ProductImage,
+    ProductOffer,
+    Review,
+    Specification,
+    Tag,
+)
+from common_mixins.signals import active_status_changed, reserved_stock_changed
+from purchase.models import Order, OrderItem, StockReservation
+from sitesettings.models import SiteSettings
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance: Product, **kwargs):
+    response_cache.invalidate_on_commit(
+        'products', 'facets', f'product:{instance.pk}'
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductOffer)
+@receiver(post_delete, sender=ProductOffer)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_product_relation(sender, instance, **kwargs):
+    """Invalidate product of saved or deleted image, offer or review"""
+    response_cache.invalidate_on_commit(
+        'products', f'product:{instance.product_id}'
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+@receiver(m2m_changed, sender=Category.subcategories.through)
+def invalidate_taxonomy(sender, **kwargs):
+    if sender in (Tag, Specification):
+        response_cache.invalidate_on_commit('taxonomy', 'facets')
+    else:
+        response_cache.invalidate_on_commit('taxonomy')
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def invalidate_product_keywords(sender, action, **kwargs):
+    """Invalidate listings on changing tags or specifications of products"""
+    if action.startswith('post_'):
+        # product pages are invalidated all at once within `taxonomy`
+        response_cache.invalidate_on_commit('products', 'taxonomy', 'facets')
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order(sender, instance: Order, **kwargs):
+    response_cache.invalidate_on_commit(f'order:{instance.pk}')
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_order_item(sender, instance: OrderItem, **kwargs):
+    response_cache.invalidate_on_commit(f'order:{instance.order_id}')
+
+
+@receiver(active_status_changed)
+def invalidate_on_status_change(sender, pks, **kwargs):
+    """Invalidate objects (de)activated in admin section"""
+    if sender is Order:
+        response_cache.invalidate_on_commit(*(f'order:{pk}' for pk in pks))
+    elif sender is Product:
+        response_cache.invalidate_on_commit(
+            'products', 'facets', *(f'product:{pk}' for pk in pks)
+        )
+    elif sender is ProductOffer:
+        response_cache.invalidate_on_commit('products')
+    elif sender is Category:
+        response_cache.invalidate_on_commit('taxonomy')
+    elif sender in (Tag, Specification):
+        response_cache.invalidate_on_commit('taxonomy', 'facets')
+
+
+@receiver(reserved_stock_changed, sender=StockReservation)
+def invalidate_reserved_products(sender, product_ids, **kwargs):
+    """Invalidate products whose available stock was changed"""
+    response_cache.invalidate_on_commit(
+        'products', *(f'product:{pk}' for pk in product_ids)
+    )
+
+
+@receiver(post_save, sender=SiteSettings)
+def reset_cache_time(sender, **kwargs):
+    """Apply changed cache time to responses cached from now on"""
+    response_cache.reset_timeout()
@@ -1,7 +1,109 @@
-from django.test import TestCase
+import os
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from hashlib import sha1
+from io import StringIO
+from unittest import mock, skipUnless
 
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count
+from django.http import HttpResponse, QueryDict
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    tag,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
 
-class AccessApiMiddlewareTest(TestCase):
+from accounts.models import Profile
+from api.cache import response_cache
+from api.catalog_api.paginators import CatalogCursorPaginator
+from api.catalog_api.views import (
+    CatalogList,
+    OfferList,
+    ProductListBanners,
+    ProductListLimited,
+    ProductListPopular,
+)
+from api.purchase_api.service import reduce_stock
+from api.renderers import FastJSONRenderer
+from api.purchase_api.views import PaymentView
+from catalog.models import (
+    Category,
+    CategoryClosure,
+    Product,
+    ProductImage,
+    ProductOffer,
+    ProductSearchDocument,
+    Review,
+    Specification,
+    Tag,
+)
+from catalog.facets import facets
+from catalog.prices import SalePrices, sale_prices
+from catalog.suggest import suggestions
+from purchase.models import (
+    CartItem,
+    DeliveryType,
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    StockReservation,
+)
+from purchase.sweeper import sweep
+
+TEST_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': alias,
+    }
+    for alias in ('default', settings.API_CACHE_ALIAS)
+}
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+    # in-memory index is not rolled back with test data
+    facets.clear()
+
+
+def benchmark(test):
+    """
+    Mark test case or test method asserting on wall-clock time,
+    benchmarks are skipped unless `RUN_BENCHMARKS` environment variable
+    is set: `RUN_BENCHMARKS=1 manage.py test api --tag=benchmark`
+    """
+    return skipUnless(
+        os.getenv('RUN_BENCHMARKS'), 'RUN_BENCHMARKS is not set'
+    )(tag('benchmark')(test))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApiTestCase(TestCase):
+    """Test case using in-memory caches instead of shared ones"""
+
+    def tearDown(self):
+        # cached data is not rolled back with test data
+        clear_caches()
+
+
+class AccessApiMiddlewareTest(ApiTestCase):
     def test_requests_with_header_passes(self):
         response = self.client.get(
             '/api/catalog/',
@@ -15,3 +117,2311 @@ class AccessApiMiddlewareTest(TestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+
+def build_middleware_chain(view):
+    """Return view wrapped in middlewares from settings"""
+    handler = view
+    for path in reversed(settings.MIDDLEWARE):
+        handler = import_string(path)(handler)
+    return handler
+
+
+class MiddlewareStackTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    def setUp(self):
+        self.requests = []
+        self.handler = build_middleware_chain(self.view)
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        self.requests.append(request)
+        return HttpResponse()
+
+    def test_api_requests_without_header_are_rejected_before_view(self):
+        response = self.handler(self.factory.get('/api/catalog/'))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.requests, [])
+
+        response = self.handler(
+            self.factory.get('/api/catalog/', headers=self.headers)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-HERE-I-AM'], 'and hello to you')
+
+    def test_session_is_not_accessed_without_cart(self):
+        for path in ('/static/style.css', '/media/image.png', '/api/catalog/'):
+            with self.subTest(path=path):
+                with self.assertNumQueries(0):
+                    self.handler(self.factory.get(path, headers=self.headers))
+                request = self.requests[-1]
+                self.assertFalse(request.session.accessed)
+                self.assertFalse(request.session.modified)
+
+    def test_reading_empty_cart_does_not_save_session(self):
+        response = self.client.get('/api/basket/', headers=self.headers)
+        self.assertEqual(response.json(), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+@benchmark
+class MiddlewareOverheadBenchmarkTest(ApiTestCase):
+    """
+    Benchmark of time spent by middlewares per request
+    """
+    headers = {'X-HERE-I-AM': 'hello'}
+    requests_amount = 2000
+    # seconds per request
+    time_limit = 0.001
+
+    def setUp(self):
+        self.handler = build_middleware_chain(lambda request: HttpResponse())
+        self.factory = RequestFactory()
+
+    def test_middleware_overhead(self):
+        for path, headers in (
+            ('/static/style.css', {}),
+            ('/api/catalog/', {}),
+            ('/api/catalog/', self.headers),
+        ):
+            with self.subTest(path=path, headers=headers):
+                request = self.factory.get(path, headers=headers)
+                start = time.perf_counter()
+                for _ in range(self.requests_amount):
+                    self.handler(request)
+                elapsed = time.perf_counter() - start
+                self.assertLess(
+                    elapsed / self.requests_amount, self.time_limit
+                )
+
+
+class ProductListingQueriesTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='category')
+        cls.tag = Tag.objects.create(name='tag')
+
+    def setUp(self):
+        clear_caches()
+
+    def create_products(self, amount: int, start: int = 0) -> None:
+        for num in range(start, start + amount):
+            product = Product.objects.create(
+                title=f'product {num}', category=self.category
+            )
+            product.tags.add(self.tag)
+            ProductImage.objects.create(product=product)
+            Review.objects.create(product=product, rate=num % 5 + 1)
+
+    def count_queries(self, url: str) -> int:
+        clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_catalog_queries_do_not_depend_on_page_size(self):
+        self.create_products(2)
+        few = self.count_queries('/api/catalog/')
+        self.create_products(6, start=2)
+        many = self.count_queries('/api/catalog/')
+        self.assertEqual(few, many)
+
+    def test_popular_queries_do_not_depend_on_amount_of_products(self):
+        self.create_products(2)
+        few = self.count_queries('/api/products/popular/')
+        self.create_products(6, start=2)
+        many = self.count_queries('/api/products/popular/')
+        self.assertEqual(few, many)
+
+    def test_annotated_values_match_model_properties(self):
+        self.create_products(3)
+        Review.objects.create(product=Product.objects.first(), rate=2)
+        response = self.client.get('/api/catalog/', headers=self.headers)
+
+        for item in response.json()['items']:
+            product = Product.objects.get(pk=item['id'])
+            self.assertEqual(item['rating'], product.rating)
+            self.assertEqual(item['reviews'], product.reviews.count())
+            self.assertEqual(item['categoryName'], self.category.title)
+            self.assertEqual(len(item['images']), 1)
+
+
+class OrderListQueriesTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+    query_budget = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='buyer')
+        cls.profile = Profile.objects.create(user=cls.user)
+        cls.delivery = DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='category')
+        cls.products = [
+            Product.objects.create(
+                title=f'product {num}', category=category, price=100 + num
+            )
+            for num in range(3)
+        ]
+        for product in cls.products:
+            ProductImage.objects.create(product=product, image='product.jpg')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_orders(self, amount: int) -> None:
+        for _ in range(amount):
+            order = Order.objects.create(
+                buyer=self.profile, deliveryType=self.delivery
+            )
+            for num, product in enumerate(self.products):
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=num + 1,
+                    price=product.price,
+                )
+
+    def get_orders(self) -> tuple[list[dict], int]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_amount_of_orders(self):
+        self.create_orders(2)
+        _, few = self.get_orders()
+        self.create_orders(48)
+        orders, many = self.get_orders()
+
+        self.assertEqual(len(orders), 50)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.query_budget)
+
+    def test_order_products(self):
+        self.create_orders(1)
+        orders, _ = self.get_orders()
+
+        self.assertEqual(
+            [
+                (p['title'], p['price'], p['count'])
+                for p in orders[0]['products']
+            ],
+            [(p.title, float(p.price), num + 1)
+             for num, p in enumerate(self.products)],
+        )
+        self.assertEqual(len(orders[0]['products'][0]['images']), 1)
+        self.assertEqual(orders[0]['totalCost'], 100 + 101 * 2 + 102 * 3 + 200)
+
+
+class OrderCreateTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='buyer')
+        Profile.objects.create(user=cls.user)
+        DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='category')
+        cls.products = Product.objects.bulk_create(
+            Product(title=f'product {num}', category=category, price=100)
+            for num in range(40)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_order(self, products: list[Product]):
+        Order.objects.all().delete()
+        sale_prices.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/api/orders/',
+                {
+                    product.pk: {'id': product.pk, 'count': 2, 'price': 1}
+                    for product in products
+                },
+                content_type='application/json',
+                headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_amount_of_lines(self):
+        _, few = self.create_order(self.products[:2])
+        order, many = self.create_order(self.products)
+        self.assertEqual(few, many)
+        self.assertEqual(len(order['products']), 40)
+        # purchases of the deleted order are removed
+        self.assertEqual(
+            set(Product.objects.values_list('purchases_count', flat=True)),
+            {2},
+        )
+
+    def test_prices_are_taken_from_database(self):
+        today = timezone.localdate()
+        first, second, third = self.products[:3]
+        ProductOffer.objects.create(
+            product=first, salePrice=80,
+            dateFrom=today - timedelta(days=1), dateTo=today,
+        )
+        ProductOffer.objects.create(
+            product=second, salePrice=50,
+            dateFrom=today - timedelta(days=2),
+            dateTo=today - timedelta(days=1),
+        )
+        ProductOffer.objects.create(
+            product=third, salePrice=10, is_active=False,
+            dateFrom=today, dateTo=today,
+        )
+
+        order, _ = self.create_order([first, second, third])
+
+        prices = dict(
+            OrderItem.objects.values_list('product', 'price')
+        )
+        self.assertEqual(
+            prices, {first.pk: 80, second.pk: 100, third.pk: 100}
+        )
+        self.assertEqual(order['totalCost'], (80 + 100 + 100) * 2 + 200)
+
+
+class SalePricesTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = today = timezone.localdate()
+        day = timedelta(days=1)
+        category = Category.objects.create(title='category')
+        cls.products = Product.objects.bulk_create(
+            Product(title=f'product {num}', category=category, price=100)
+            for num in range(5)
+        )
+        first, second, third, fourth, _ = cls.products
+        ProductOffer.objects.bulk_create((
+            ProductOffer(
+                product=first, salePrice=90,
+                dateFrom=today - day, dateTo=today + 5 * day,
+            ),
+            ProductOffer(
+                product=first, salePrice=80,
+                dateFrom=today, dateTo=today + 2 * day,
+            ),
+            ProductOffer(
+                product=second, salePrice=50,
+                dateFrom=today - 2 * day, dateTo=today - day,
+            ),
+            ProductOffer(
+                product=third, salePrice=10, is_active=False,
+                dateFrom=today, dateTo=today,
+            ),
+            ProductOffer(
+                product=fourth, salePrice=70,
+                dateFrom=today + day, dateTo=today + 3 * day,
+            ),
+        ))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_prices_of_offers_lasting_today_are_resolved(self):
+        ids = [product.pk for product in self.products]
+        # the next offer boundary and prices of the products
+        with self.assertNumQueries(2):
+            prices = sale_prices.resolve(ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(sale_prices.resolve(ids), prices)
+        self.assertEqual(prices, {ids[0]: 80})
+
+    def test_only_requested_prices_are_loaded(self):
+        first, second = self.products[:2]
+        with self.assertNumQueries(2):
+            self.assertEqual(sale_prices.resolve([second.pk]), {})
+        version = sale_prices.get()[1]
+        keys = [
+            sale_prices.make_key(version, product.pk)
+            for product in self.products
+        ]
+        self.assertEqual(list(sale_prices.cache.get_many(keys)), [keys[1]])
+        # only prices missing in the cache are loaded
+        with self.assertNumQueries(1) as context:
+            self.assertEqual(
+                sale_prices.resolve([first.pk, second.pk]), {first.pk: 80}
+            )
+        self.assertIn(f'IN ({first.pk})', context.captured_queries[0]['sql'])
+        with self.assertNumQueries(0):
+            sale_prices.get_period()
+
+    def test_prices_are_cached_until_next_offer_boundary(self):
+        boundary, version = sale_prices.get()
+        # the offer of the fourth product starts tomorrow
+        self.assertEqual(boundary, self.today + timedelta(days=1))
+        self.assertEqual(sale_prices.get_period(), boundary.isoformat())
+        self.assertLessEqual(SalePrices.get_timeout(boundary), 60 * 60 * 24)
+
+        # the entry is outdated when the boundary comes
+        sale_prices.cache.set(sale_prices.cache_key, (self.today, version))
+        with self.assertNumQueries(1):
+            self.assertEqual(sale_prices.get()[0], boundary)
+        self.assertNotEqual(sale_prices.get()[1], version)
+
+    def test_changed_offers_drop_prices(self):
+        product = self.products[-1]
+        self.assertEqual(sale_prices.resolve([product.pk]), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = ProductOffer.objects.create(
+                product=product, salePrice=60,
+                dateFrom=self.today, dateTo=self.today,
+            )
+            # prices are dropped only when the offer is committed
+            self.assertEqual(sale_prices.resolve([product.pk]), {})
+        self.assertEqual(sale_prices.resolve([product.pk]), {product.pk: 60})
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.delete()
+        self.assertEqual(sale_prices.resolve([product.pk]), {})
+
+    def test_listings_have_current_prices(self):
+        first, second = self.products[:2]
+        response = self.client.get('/api/catalog/', headers=self.headers)
+        prices = {
+            item['id']: item['price'] for item in response.json()['items']
+        }
+        self.assertEqual(prices[first.pk], 80)
+        self.assertEqual(prices[second.pk], 100)
+
+        response = self.client.get('/api/sales/', headers=self.headers)
+        self.assertEqual(
+            sorted(
+                (item['id'], item['salePrice']) for item in response.json()
+            ),
+            [(first.pk, 80), (first.pk, 90)],
+        )
+
+    def test_cached_listings_expire_on_next_offer_boundary(self):
+        first = self.products[0]
+
+        def get_price():
+            response = self.client.get('/api/catalog/', headers=self.headers)
+            for item in response.json()['items']:
+                if item['id'] == first.pk:
+                    return item['price']
+
+        def get_detail_price():
+            response = self.client.get(
+                f'/api/products/{first.pk}/', headers=self.headers
+            )
+            return response.json()['price']
+
+        self.assertEqual(get_price(), 80)
+        self.assertEqual(get_detail_price(), 80)
+        # prices of the next period
+        tomorrow = self.today + timedelta(days=1)
+        sale_prices.cache.set(
+            sale_prices.cache_key, (tomorrow + timedelta(days=1), 'next')
+        )
+        sale_prices.cache.set(
+            sale_prices.make_key('next', first.pk), Decimal(70)
+        )
+        self.assertEqual(get_price(), 70)
+        self.assertEqual(get_detail_price(), 70)
+
+
+class CartTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='buyer')
+        Profile.objects.create(user=cls.user)
+        category = Category.objects.create(title='category')
+        cls.products = Product.objects.bulk_create(
+            Product(title=f'product {num}', category=category, price=100)
+            for num in range(20)
+        )
+
+    def add(self, product: Product, count: int = 1):
+        response = self.client.post(
+            '/api/basket/',
+            {'id': product.pk, 'count': count},
+            content_type='application/json',
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_basket(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/basket/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            query for query in context.captured_queries
+            if 'catalog_' in query['sql']
+        ]
+        return response.json(), len(queries)
+
+    def test_anonymous_cart_is_stored_in_session(self):
+        first, second = self.products[:2]
+        self.add(first, 2)
+        self.add(first)
+        basket = self.add(second)
+
+        self.assertEqual(
+            {item['id']: item['count'] for item in basket},
+            {first.pk: 3, second.pk: 1},
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_user_cart_is_stored_in_database(self):
+        first, second = self.products[:2]
+        self.client.force_login(self.user)
+        self.add(first, 3)
+        self.add(second)
+        self.client.delete(
+            f'/api/basket/?id={first.pk}&count=1', headers=self.headers
+        )
+
+        self.assertEqual(
+            dict(
+                CartItem.objects
+                .filter(user=self.user)
+                .values_list('product', 'count')
+            ),
+            {first.pk: 2, second.pk: 1},
+        )
+
+        # another device of the user gets the same cart
+        self.client.logout()
+        self.client.force_login(self.user)
+        basket, _ = self.get_basket()
+        self.assertEqual(
+            {item['id']: item['count'] for item in basket},
+            {first.pk: 2, second.pk: 1},
+        )
+
+    def test_reducing_by_whole_count_removes_product(self):
+        first, second = self.products[:2]
+        for user in (self.user, None):
+            with self.subTest(user=user):
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                self.add(first, 2)
+                self.add(second, 2)
+                for product, count in ((first, 2), (second, 5)):
+                    response = self.client.delete(
+                        f'/api/basket/?id={product.pk}&count={count}',
+                        headers=self.headers,
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+                basket, _ = self.get_basket()
+                self.assertEqual(basket, [])
+                self.assertFalse(CartItem.objects.exists())
+
+    def test_session_cart_is_merged_on_login(self):
+        first, second = self.products[:2]
+        CartItem.objects.create(user=self.user, product=first, count=1)
+        self.add(first, 2)
+        self.add(second)
+
+        self.client.force_login(self.user)
+
+        self.assertEqual(
+            dict(
+                CartItem.objects
+                .filter(user=self.user)
+                .values_list('product', 'count')
+            ),
+            {first.pk: 3, second.pk: 1},
+        )
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+
+    def test_cart_has_current_prices(self):
+        today = timezone.localdate()
+        product = self.products[0]
+        self.client.force_login(self.user)
+        self.add(product)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductOffer.objects.create(
+                product=product, salePrice=80, dateFrom=today, dateTo=today,
+            )
+
+        basket, _ = self.get_basket()
+        self.assertEqual(basket[0]['price'], 80)
+
+    def test_summary(self):
+        today = timezone.localdate()
+        first, second = self.products[:2]
+        ProductOffer.objects.create(
+            product=first, salePrice=Decimal('79.99'),
+            dateFrom=today, dateTo=today,
+        )
+        # session, user (if any) and products
+        for user, queries in ((self.user, 3), (None, 2)):
+            with self.subTest(user=user):
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                self.add(first, 3)
+                self.add(second)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        '/api/basket/summary/', headers=self.headers
+                    )
+                self.assertEqual(
+                    response.json(),
+                    {'products': 2, 'count': 4, 'totalCost': 339.97},
+                )
+
+    def test_queries_do_not_depend_on_amount_of_products(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                self.add(self.products[0])
+                _, few = self.get_basket()
+                for product in self.products[1:]:
+                    self.add(product)
+                basket, many = self.get_basket()
+                self.assertEqual(len(basket), len(self.products))
+                self.assertEqual(few, many)
+
+
+class OrderCostsTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.regular = DeliveryType.objects.create(type='regular', cost=200)
+        cls.express = DeliveryType.objects.create(type='express', cost=700)
+        category = Category.objects.create(title='category')
+        cls.product = Product.objects.create(
+            title='product', category=category, price=500
+        )
+
+    def assertCosts(self, order: Order, items, delivery, total):
+        order.refresh_from_db()
+        self.assertEqual(
+            (order.items_cost, order.delivery_cost, order.total_cost),
+            (items, delivery, total),
+        )
+
+    def test_costs_follow_purchases_and_delivery_type(self):
+        order = Order.objects.create(deliveryType=self.regular)
+        self.assertCosts(order, 0, 200, 200)
+
+        item = OrderItem.objects.create(
+            order=order, product=self.product, quantity=2, price=500
+        )
+        self.assertCosts(order, 1000, 200, 1200)
+
+        item.quantity = 4
+        item.save()
+        # regular delivery is free from 2000
+        self.assertCosts(order, 2000, 0, 2000)
+
+        order.deliveryType = self.express
+        order.save()
+        self.assertCosts(order, 2000, 700, 2700)
+
+        item.delete()
+        self.assertCosts(order, 0, 700, 700)
+
+    def test_costs_are_captured(self):
+        order = Order.objects.create(deliveryType=self.regular)
+        OrderItem.objects.create(
+            order=order, product=self.product, quantity=1, price=500
+        )
+        self.product.price = 1000
+        self.product.save()
+        DeliveryType.objects.filter(pk=self.regular.pk).update(cost=300)
+        self.assertCosts(order, 500, 200, 700)
+
+        order.status = 'awaiting payment'
+        order.save()
+        self.assertCosts(order, 500, 200, 700)
+        order.save(update_fields=['status'])
+        self.assertCosts(order, 500, 200, 700)
+
+        order.deliveryType = self.express
+        order.save()
+        order.deliveryType = self.regular
+        order.save()
+        self.assertCosts(order, 500, 300, 800)
+
+
+class ProductPurchasesTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='category')
+        cls.first, cls.second = (
+            Product.objects.create(title=title, category=category)
+            for title in ('first', 'second')
+        )
+        cls.order = Order.objects.create(deliveryType=delivery)
+
+    def assertPurchases(self, first, second):
+        self.assertEqual(
+            list(
+                Product.objects
+                .filter(pk__in=(self.first.pk, self.second.pk))
+                .order_by('pk')
+                .values_list('purchases_count', flat=True)
+            ),
+            [first, second],
+        )
+
+    def test_purchases_follow_order_items(self):
+        item = OrderItem.objects.create(
+            order=self.order, product=self.first, quantity=2
+        )
+        self.assertPurchases(2, 0)
+
+        item.quantity = 5
+        item.save()
+        self.assertPurchases(5, 0)
+
+        item.product = self.second
+        item.quantity = 3
+        item.save()
+        self.assertPurchases(0, 3)
+
+        item.delete()
+        self.assertPurchases(0, 0)
+
+    def test_purchases_are_rebuilt(self):
+        OrderItem.objects.bulk_create(
+            OrderItem(order=self.order, product=self.first, quantity=quantity)
+            for quantity in (1, 4)
+        )
+        self.assertPurchases(0, 0)
+        Product.objects.rebuild_purchases()
+        self.assertPurchases(5, 0)
+
+
+class PaymentTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+    card_number = '12345678'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='buyer')
+        profile = Profile.objects.create(user=cls.user)
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='category')
+        cls.first = Product.objects.create(
+            title='first', category=category, stock=5
+        )
+        cls.second = Product.objects.create(
+            title='second', category=category, stock=1
+        )
+        cls.order = Order.objects.create(
+            buyer=profile, deliveryType=delivery, status='awaiting payment'
+        )
+        for product, quantity in ((cls.first, 3), (cls.second, 1)):
+            OrderItem.objects.create(
+                order=cls.order, product=product, quantity=quantity
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pay(self):
+        return self.client.post(
+            '/api/payment/',
+            {'number': self.card_number},
+            content_type='application/json',
+            headers=self.headers,
+        )
+
+    def test_payment_reduces_stock(self):
+        self.assertEqual(self.pay().status_code, 200)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (2, 0))
+        self.assertEqual(self.order.status, 'paid')
+
+    def test_shortfalls_are_reported(self):
+        Product.objects.filter(pk=self.first.pk).update(stock=1)
+
+        response = self.pay()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['shortfalls'],
+            [{'id': self.first.pk, 'title': 'first',
+              'required': 3, 'missing': 2}],
+        )
+
+        # nothing is reduced if any product doesn't have enough stock
+        self.second.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.second.stock, 1)
+        self.assertEqual(self.order.status, 'awaiting payment')
+
+
+class IdempotentPaymentTest(PaymentTest):
+    def pay(self, key: str = 'key'):
+        return self.client.post(
+            '/api/payment/',
+            {'number': self.card_number},
+            content_type='application/json',
+            headers={**self.headers, 'Idempotency-Key': key},
+        )
+
+    def test_retry_returns_stored_response(self):
+        Product.objects.filter(pk=self.first.pk).update(stock=1)
+        first = self.pay()
+        self.assertEqual(first.status_code, 400)
+
+        # stock is enough now, but the retry gets the first response
+        Product.objects.filter(pk=self.first.pk).update(stock=5)
+        with CaptureQueriesContext(connection) as context:
+            retry = self.pay()
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry.json(), first.json())
+        self.assertFalse(
+            any(
+                'catalog_product' in query['sql']
+                for query in context.captured_queries
+            )
+        )
+
+        self.assertEqual(self.pay('another key').status_code, 200)
+        self.assertEqual(self.pay('another key').status_code, 200)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 2)
+
+    def test_request_in_progress(self):
+        IdempotencyKey.objects.create(user=self.user, key='key')
+        with mock.patch.object(PaymentView, 'idempotency_wait', 0.2):
+            response = self.pay()
+        self.assertEqual(response.status_code, 409)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'awaiting payment')
+
+    def test_abandoned_key_is_claimed_again(self):
+        record = IdempotencyKey.objects.create(user=self.user, key='key')
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            created_at=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TIMEOUT + 1
+            )
+        )
+        self.assertEqual(self.pay().status_code, 200)
+
+        record.refresh_from_db()
+        self.assertEqual(record.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+
+    def test_expired_keys_are_purged(self):
+        self.pay()
+        self.pay('another key')
+        IdempotencyKey.objects.create(user=self.user, key='in progress')
+        IdempotencyKey.objects.filter(key='key').update(
+            created_at=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TTL + 1
+            )
+        )
+
+        out = StringIO()
+        call_command('purgeidempotencykeys', stdout=out)
+        self.assertIn('Purged 1 idempotency keys', out.getvalue())
+        self.assertEqual(
+            sorted(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['another key', 'in progress'],
+        )
+
+
+class StockReservationTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='category')
+        cls.product = Product.objects.create(
+            title='limited', category=category, stock=2, is_limited=True
+        )
+        cls.users = [
+            User.objects.create_user(f'buyer {num}', password='buyer')
+            for num in range(2)
+        ]
+        cls.orders = []
+        for user in cls.users:
+            order = Order.objects.create(
+                buyer=Profile.objects.create(user=user), status='accepted'
+            )
+            OrderItem.objects.create(
+                order=order, product=cls.product, quantity=2
+            )
+            cls.orders.append(order)
+
+    def setUp(self):
+        clear_caches()
+
+    def confirm(self, num: int):
+        self.client.force_login(self.users[num])
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f'/api/orders/{self.orders[num].pk}/',
+                {
+                    'deliveryType': 'regular',
+                    'city': 'city',
+                    'address': 'address',
+                },
+                content_type='application/json',
+                headers=self.headers,
+            )
+
+    def available_ids(self) -> list[int]:
+        response = self.client.get(
+            '/api/catalog/', {'available': True}, headers=self.headers
+        )
+        return [item['id'] for item in response.json()['items']]
+
+    def test_confirmation_reserves_stock(self):
+        self.assertEqual(self.available_ids(), [self.product.pk])
+        self.assertEqual(self.confirm(0).status_code, 201)
+
+        self.assertEqual(self.product.available_stock, 0)
+        self.assertFalse(self.product.available)
+        self.assertEqual(self.available_ids(), [])
+
+        # stock is reserved for the first order
+        response = self.confirm(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['shortfalls'][0]['missing'], 2)
+        self.orders[1].refresh_from_db()
+        self.assertEqual(self.orders[1].status, 'accepted')
+
+    def test_reserved_stock_is_paid(self):
+        self.confirm(0)
+        response = self.client.post(
+            '/api/payment/',
+            {'number': '12345678'},
+            content_type='application/json',
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        self.confirm(0)
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        # expired reservations don't hold stock even before releasing
+        self.assertEqual(self.available_ids(), [self.product.pk])
+        self.assertEqual(self.confirm(1).status_code, 201)
+
+        out = StringIO()
+        call_command('releasereservations', stdout=out)
+        self.assertIn('Released 1 stock reservations', out.getvalue())
+        self.assertEqual(
+            list(StockReservation.objects.values_list('order', flat=True)),
+            [self.orders[1].pk],
+        )
+
+    def test_sweeper(self):
+        self.confirm(0)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(sweep(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StockStressTest(TransactionTestCase):
+    stock = 20
+    workers = 8
+    attempts = 5
+
+    def setUp(self):
+        category = Category.objects.create(title='category')
+        self.products = [
+            Product.objects.create(
+                title=f'product {num}', category=category, stock=self.stock
+            )
+            for num in range(2)
+        ]
+
+    def buy(self, results: list) -> None:
+        # every worker buys both products in opposite order of the others
+        required = {product.pk: 1 for product in self.products}
+        if len(results) % 2:
+            required = dict(reversed(required.items()))
+        try:
+            for _ in range(self.attempts):
+                while True:
+                    try:
+                        results.append(not reduce_stock(required))
+                        break
+                    except OperationalError:
+                        # SQLite doesn't wait for locked tables
+                        time.sleep(random.uniform(0.001, 0.01))
+        finally:
+            connection.close()
+
+    def test_stock_is_not_oversold(self):
+        results = []
+        threads = [
+            threading.Thread(target=self.buy, args=(results,))
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = results.count(True)
+        self.assertEqual(len(results), self.workers * self.attempts)
+        self.assertEqual(sold, self.stock)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 0)
+
+
+class ProductReviewStatsTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        cls.product = Product.objects.create(title='first', category=category)
+        cls.another = Product.objects.create(title='second', category=category)
+
+    def assertStats(self, product: Product, rating_sum, reviews_count, rating):
+        product.refresh_from_db()
+        self.assertEqual(product.rating_sum, rating_sum)
+        self.assertEqual(product.reviews_count, reviews_count)
+        self.assertEqual(product.rating, rating)
+
+    def test_stats_follow_review_changes(self):
+        review = Review.objects.create(product=self.product, rate=5)
+        Review.objects.create(product=self.product, rate=2)
+        self.assertStats(self.product, 7, 2, 3.5)
+
+        review.rate = 3
+        review.save()
+        self.assertStats(self.product, 5, 2, 2.5)
+
+        review.product = self.another
+        review.save()
+        self.assertStats(self.product, 2, 1, 2)
+        self.assertStats(self.another, 3, 1, 3)
+
+        Review.objects.filter(product=self.product).delete()
+        self.assertStats(self.product, 0, 0, 0)
+
+    def test_stats_follow_review_created_through_api(self):
+        response = self.client.post(
+            f'/api/products/{self.product.pk}/review/',
+            {'author': 'author', 'text': 'text', 'rate': 4},
+            content_type='application/json',
+            headers={'X-HERE-I-AM': 'hello'},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertStats(self.product, 4, 1, 4)
+
+    def test_rebuild_command_restores_stats(self):
+        Review.objects.create(product=self.product, rate=4)
+        Review.objects.create(product=self.product, rate=1)
+        Product.objects.update(rating_sum=0, reviews_count=0, rating_avg=0)
+
+        call_command('rebuildratings', stdout=StringIO())
+        self.assertStats(self.product, 5, 2, 2.5)
+        self.assertStats(self.another, 0, 0, 0)
+
+
+class CatalogFanOutTest(ApiTestCase):
+    """
+    Purchases of products of `api/catalog/` shouldn't be multiplied
+    by joins with tags and reviews
+    """
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        first_tag = Tag.objects.create(name='first')
+        second_tag = Tag.objects.create(name='second')
+        Tag.objects.create(name='third')
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        order = Order.objects.create(deliveryType=delivery)
+        cls.purchases = {}
+        for num, (tags, quantities) in enumerate((
+            ((first_tag, second_tag), (1, 2)),
+            ((first_tag,), (5,)),
+            ((second_tag,), (1, 1)),
+            ((first_tag, second_tag), (4,)),
+            ((), (10,)),
+        )):
+            product = Product.objects.create(
+                title=f'product {num}', category=category
+            )
+            product.tags.set(tags)
+            for rate in range(1, 4):
+                Review.objects.create(product=product, rate=rate)
+            for quantity in quantities:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=quantity
+                )
+            if tags:
+                cls.purchases[product.pk] = sum(quantities)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_purchases_are_not_multiplied(self):
+        response = self.client.get(
+            '/api/catalog/?tags[]=first&tags[]=second&tags[]=third',
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        view = response.renderer_context['view']
+        self.assertEqual(
+            {
+                product['pk']: product['purchases_count']
+                for product in view.get_queryset().values(
+                    'pk', 'purchases_count'
+                )
+            },
+            self.purchases,
+        )
+        # products are ordered by amount of purchases
+        self.assertEqual(
+            [item['id'] for item in response.json()['items']],
+            sorted(self.purchases, key=self.purchases.get, reverse=True),
+        )
+
+
+@benchmark
+class CatalogFanOutBenchmarkTest(ApiTestCase):
+    """
+    Regression benchmark for `api/catalog/` on a dataset with 100k
+    order items
+    """
+    headers = {'X-HERE-I-AM': 'hello'}
+    products_amount = 50
+    order_items_amount = 100_000
+    time_limit = 2.0
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        first_tag = Tag.objects.create(name='first')
+        second_tag = Tag.objects.create(name='second')
+        cls.products = Product.objects.bulk_create(
+            Product(title=f'product {num}', category=category)
+            for num in range(cls.products_amount)
+        )
+        for num, product in enumerate(cls.products):
+            product.tags.add(first_tag)
+            if num % 2:
+                product.tags.add(second_tag)
+            for rate in range(1, 6):
+                Review.objects.create(product=product, rate=rate)
+
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        orders = Order.objects.bulk_create(
+            Order(deliveryType=delivery) for _ in range(1000)
+        )
+        OrderItem.objects.bulk_create(
+            (
+                OrderItem(
+                    order=orders[num % len(orders)],
+                    product=cls.products[num % cls.products_amount],
+                    quantity=num % 3 + 1,
+                )
+                for num in range(cls.order_items_amount)
+            ),
+            batch_size=5000,
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def test_catalog_response_time(self):
+        url = '/api/catalog/?tags[]=first&tags[]=second&sort=-reviews'
+        start = time.perf_counter()
+        response = self.client.get(url, headers=self.headers)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['lastPage'], -(-self.products_amount // 8)
+        )
+        self.assertEqual(
+            {item['reviews'] for item in response.json()['items']}, {5}
+        )
+        self.assertLess(elapsed, self.time_limit)
+
+
+class ValuesSerializersTest(ApiTestCase):
+    views = {
+        '/api/catalog/': CatalogList,
+        '/api/catalog/?sort=-price&tags[]=first': CatalogList,
+        '/api/products/popular/': ProductListPopular,
+        '/api/products/limited/': ProductListLimited,
+        '/api/banners/': ProductListBanners,
+        '/api/sales/': OfferList,
+    }
+    serializations_amount = 20
+
+    def setUp(self):
+        clear_caches()
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='категория')
+        tags = [Tag.objects.create(name=name) for name in ('first', 'second')]
+        specifications = [
+            Specification.objects.create(name='color', value=value)
+            for value in ('red', 'green')
+        ]
+        today = timezone.localdate()
+        for num in range(30):
+            product = Product.objects.create(
+                title=f'товар {num}',
+                category=category,
+                price=Decimal('10.05') * num,
+                stock=num % 7,
+                fullDescription='описание ' * num,
+                is_limited=bool(num % 3),
+            )
+            product.tags.set(tags[:num % 3])
+            product.specifications.set(specifications[num % 2:])
+            for _ in range(num % 3):
+                ProductImage.objects.create(product=product)
+            Review.objects.create(product=product, rate=num % 5 + 1)
+            if num % 4 == 0:
+                ProductOffer.objects.create(
+                    product=product, salePrice=Decimal('1.10') * num,
+                    dateFrom=today, dateTo=today + timedelta(days=num),
+                )
+
+    def get_queryset(self, url: str):
+        view = self.views[url]()
+        request = RequestFactory().get(url)
+        view.setup(request)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        return view, view.filter_queryset(view.get_queryset())
+
+    def serialize(self, url: str) -> tuple[list, list]:
+        """Return data serialized by model and values serializers"""
+        view, queryset = self.get_queryset(url)
+        serializer = view.values_serializer_class
+        return (
+            view.serializer_class(queryset, many=True).data,
+            serializer.serialize(list(serializer.get_values(queryset))),
+        )
+
+    def test_output_is_the_same_as_output_of_model_serializers(self):
+        for url in self.views:
+            with self.subTest(url=url):
+                expected, data = self.serialize(url)
+                self.assertTrue(data)
+                self.assertEqual(
+                    FastJSONRenderer().render(data),
+                    FastJSONRenderer().render(expected),
+                )
+
+    def test_queries_do_not_depend_on_amount_of_products(self):
+        view, queryset = self.get_queryset('/api/catalog/')
+        serializer = view.values_serializer_class
+        # the next offer boundary is cached after the first query,
+        # sale prices of products missing in the cache are loaded at once
+        for rows, queries in ((queryset[:2], 6), (queryset, 5)):
+            with self.assertNumQueries(queries):
+                serializer.serialize(list(serializer.get_values(rows)))
+
+    @benchmark
+    def test_serialization_time(self):
+        """
+        Microbenchmark of values and model serializers
+        """
+        for url in self.views:
+            with self.subTest(url=url):
+                view, queryset = self.get_queryset(url)
+                serializer = view.values_serializer_class
+                start = time.perf_counter()
+                for _ in range(self.serializations_amount):
+                    view.serializer_class(queryset.all(), many=True).data
+                model_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(self.serializations_amount):
+                    serializer.serialize(
+                        list(serializer.get_values(queryset.all()))
+                    )
+                values_time = time.perf_counter() - start
+
+                self.assertLess(values_time, model_time)
+
+
+class SparseFieldsetsTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        tag = Tag.objects.create(name='tag')
+        cls.product = Product.objects.create(
+            title='product', category=category, fullDescription='text'
+        )
+        cls.product.tags.add(tag)
+        ProductImage.objects.create(product=cls.product)
+        Review.objects.create(product=cls.product, rate=5)
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, url: str):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers=self.headers)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'catalog_' in query['sql']
+        ]
+
+    def test_product_fields(self):
+        url = f'/api/products/{self.product.pk}/'
+        response, _ = self.get(url)
+        self.assertEqual(len(response.json()), 17)
+        self.assertEqual(response.json()['reviews'][0]['rate'], 5)
+
+        response, queries = self.get(url + '?fields=title,id,price,images')
+        self.assertEqual(
+            response.json(),
+            {
+                'id': self.product.pk,
+                'price': 0.0,
+                'title': 'product',
+                'images': ['/media/fixtures/images/notebook.png'],
+            },
+        )
+        # product and its images
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('fullDescription', queries[0])
+
+    def test_listing_fields(self):
+        response, queries = self.get('/api/catalog/?fields=id,title,tags')
+        self.assertEqual(
+            response.json()['items'],
+            [{'id': self.product.pk, 'title': 'product', 'tags': [
+                {'id': self.product.tags.get().pk, 'name': 'tag'}
+            ]}],
+        )
+        self.assertFalse(
+            [sql for sql in queries if 'catalog_productimage' in sql]
+        )
+        self.assertFalse(
+            [sql for sql in queries if 'fullDescription' in sql]
+        )
+
+    def test_unknown_fields(self):
+        for url in (
+            f'/api/products/{self.product.pk}/?fields=id,secret',
+            '/api/products/popular/?fields=secret',
+        ):
+            with self.subTest(url=url):
+                response, _ = self.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('fields', response.json())
+
+
+class CategoryTreeTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root, cls.child, cls.leaf, cls.other = (
+            Category.objects.create(title=title)
+            for title in ('root', 'child', 'leaf', 'other')
+        )
+        cls.root.subcategories.add(cls.child)
+        cls.child.subcategories.add(cls.leaf)
+        for num, category in enumerate(
+            (cls.child, cls.leaf, cls.leaf, cls.other)
+        ):
+            Product.objects.create(title=f'product {num}', category=category)
+        Product.objects.create(
+            title='inactive', category=cls.leaf, is_active=False
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def get_counts(self) -> dict[str, int]:
+        return dict(Category.objects.values_list('title', 'products_count'))
+
+    def test_closure_table(self):
+        self.assertEqual(
+            set(
+                CategoryClosure.objects
+                .filter(ancestor=self.root)
+                .values_list('descendant__title', 'depth')
+            ),
+            {('root', 0), ('child', 1), ('leaf', 2)},
+        )
+
+    def test_products_count(self):
+        self.assertEqual(
+            self.get_counts(),
+            {'root': 3, 'child': 3, 'leaf': 2, 'other': 1},
+        )
+
+        self.child.subcategories.remove(self.leaf)
+        self.assertEqual(
+            self.get_counts(),
+            {'root': 1, 'child': 1, 'leaf': 2, 'other': 1},
+        )
+
+        self.other.subcategories.add(self.leaf)
+        product = Product.objects.get(title='product 3')
+        product.is_active = False
+        product.save()
+        self.assertEqual(
+            self.get_counts(),
+            {'root': 1, 'child': 1, 'leaf': 2, 'other': 2},
+        )
+
+    def test_products_count_of_moved_product(self):
+        product = Product.objects.get(title='product 3')
+        # only the old and the new category and their ancestors are updated
+        with CaptureQueriesContext(connection) as context:
+            product.category = self.leaf
+            product.save()
+        updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "catalog_category"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"catalog_categoryclosure"', updates[0])
+        self.assertEqual(
+            self.get_counts(),
+            {'root': 4, 'child': 4, 'leaf': 3, 'other': 0},
+        )
+
+        # saving without changes of category and status changes no counts
+        with CaptureQueriesContext(connection) as context:
+            product.title = 'renamed'
+            product.save()
+            product.save(update_fields=['title'])
+        self.assertFalse(
+            any(
+                query['sql'].startswith('UPDATE "catalog_category"')
+                for query in context.captured_queries
+            )
+        )
+
+        product.delete()
+        self.assertEqual(
+            self.get_counts(),
+            {'root': 3, 'child': 3, 'leaf': 2, 'other': 0},
+        )
+
+    def test_catalog_filter_by_category_subtree(self):
+        for category, amount in (
+            (self.root, 3), (self.leaf, 2), (self.other, 1)
+        ):
+            with self.subTest(category=category):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(
+                        f'/api/catalog/?category={category.pk}',
+                        headers=self.headers,
+                    )
+                self.assertEqual(len(response.json()['items']), amount)
+                products_queries = [
+                    query for query in context.captured_queries
+                    if 'FROM "catalog_product"' in query['sql']
+                ]
+                # count and page of products
+                self.assertEqual(len(products_queries), 2)
+
+    def test_tree(self):
+        self.other.subcategories.add(self.leaf)
+        self.other.subcategories.add(self.root)
+        self.root.subcategories.add(self.other)
+        self.leaf.is_active = False
+        self.leaf.save()
+
+        # categories, subcategories and cache time of the response
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/categories/tree/', headers=self.headers
+            )
+
+        def titles(nodes):
+            return [
+                (node['title'], node['productsCount'],
+                 titles(node['subcategories']))
+                for node in nodes
+            ]
+
+        # there is no root in the cycle of `root` and `other`
+        self.assertEqual(response.json(), [])
+
+        self.root.subcategories.remove(self.other)
+        clear_caches()
+        response = self.client.get('/api/categories/tree/', headers=self.headers)
+        self.assertEqual(
+            titles(response.json()),
+            [('other', 1 + 2 + 1, [('root', 3, [('child', 3, [])])])],
+        )
+        self.assertEqual(
+            response.json()[0]['href'], f'/catalog/{self.other.pk}'
+        )
+
+
+class CatalogFacetsTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        first, second = (
+            Tag.objects.create(name=name) for name in ('first', 'second')
+        )
+        red, green, large = (
+            Specification.objects.create(name=name, value=value)
+            for name, value in (
+                ('color', 'red'), ('color', 'green'), ('size', 'L')
+            )
+        )
+        cls.products = {}
+        for title, price, tags, specifications, is_active in (
+            ('p1', 100, (first, second), (red,), True),
+            ('p2', 200, (first,), (green,), True),
+            ('p3', 300, (second,), (red, large), True),
+            ('p4', 100, (first,), (red,), False),
+        ):
+            product = Product.objects.create(
+                title=title, category=category, price=price,
+                is_active=is_active,
+            )
+            product.tags.set(tags)
+            product.specifications.set(specifications)
+            cls.products[title] = product
+
+    def setUp(self):
+        clear_caches()
+
+    def get_catalog(self, query: str) -> set[str]:
+        response = self.client.get(
+            f'/api/catalog/?{query}', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return {item['title'] for item in response.json()['items']}
+
+    def get_facets(self, query: str = '') -> dict:
+        clear_caches()
+        response = self.client.get(
+            f'/api/catalog/facets/?{query}', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return {
+            **{tag['name']: tag['count'] for tag in data['tags']},
+            **{
+                f"{spec['name']}:{spec['value']}": spec['count']
+                for spec in data['specifications']
+            },
+        }
+
+    def test_filter(self):
+        # selections of more products are filtered by database
+        for max_ids in (settings.FACET_FILTER_MAX_IDS, 1):
+            with self.settings(FACET_FILTER_MAX_IDS=max_ids):
+                self.check_filter()
+
+    def check_filter(self):
+        for query, titles in (
+            ('tags[]=first', {'p1', 'p2'}),
+            ('tags[]=first&tags[]=second', {'p1', 'p2', 'p3'}),
+            ('tags[]=first&specs[]=color:red', {'p1'}),
+            ('specs[]=color:red&specs[]=color:green', {'p1', 'p2', 'p3'}),
+            ('specs[]=color:red&specs[]=size:L', {'p3'}),
+            ('specs[]=color:red&maxPrice=150', {'p1'}),
+            ('tags[]=unknown', set()),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.get_catalog(query), titles)
+
+    def test_counts(self):
+        self.assertEqual(
+            self.get_facets(),
+            {
+                'first': 2, 'second': 2,
+                'color:red': 2, 'color:green': 1, 'size:L': 1,
+            },
+        )
+        # not selected facets without products are omitted
+        self.assertEqual(
+            self.get_facets('tags[]=first&specs[]=size:XL'),
+            {'first': 0, 'size:XL': 0},
+        )
+        self.assertEqual(
+            self.get_facets('tags[]=first&maxPrice=150'),
+            {'first': 1, 'second': 1, 'color:red': 1},
+        )
+
+    def test_index_is_rebuilt_for_new_version(self):
+        self.assertEqual(self.get_catalog('tags[]=second'), {'p1', 'p3'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products['p2'].tags.add(Tag.objects.get(name='second'))
+            self.products['p1'].tags.clear()
+            p4 = self.products['p4']
+            p4.is_active = True
+            p4.save()
+
+        # the index is rebuilt once for the new version
+        with mock.patch.object(facets, 'build', wraps=facets.build) as build:
+            self.assertEqual(self.get_catalog('tags[]=second'), {'p2', 'p3'})
+            response = self.client.get(
+                '/api/catalog/facets/?tags[]=second', headers=self.headers
+            )
+        build.assert_called_once()
+        self.assertEqual(
+            {tag['name']: tag['count'] for tag in response.json()['tags']},
+            {'first': 2, 'second': 2},
+        )
+
+
+class CatalogCursorPaginationTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        for num in range(20):
+            product = Product.objects.create(
+                title=f'product {num}', category=category, price=num % 3
+            )
+            Review.objects.create(product=product, rate=num % 5 + 1)
+
+    def setUp(self):
+        clear_caches()
+
+    def walk_pages(self, sort: str) -> list[int]:
+        ids, cursor, page = [], '', 1
+        while cursor is not None:
+            response = self.client.get(
+                '/api/catalog/',
+                {'cursor': cursor, 'sort': sort},
+                headers=self.headers,
+            )
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data['currentPage'], page)
+            self.assertEqual(data['lastPage'], 3)
+            ids.extend(item['id'] for item in data['items'])
+            cursor, page = data['nextCursor'], page + 1
+        return ids
+
+    def test_pages_are_stable_for_every_sort(self):
+        orderings = {
+            '': ('pk',),
+            'price': ('price', 'pk'),
+            '-price': ('-price', 'pk'),
+            '-created': ('-created_at', 'pk'),
+            'reviews': ('reviews_count', 'pk'),
+            '-rating': ('-rating_avg', 'pk'),
+        }
+        for sort, ordering in orderings.items():
+            with self.subTest(sort=sort):
+                expected = list(
+                    Product.objects.order_by(*ordering)
+                    .values_list('pk', flat=True)
+                )
+                self.assertEqual(self.walk_pages(sort), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            '/api/catalog/', {'cursor': 'garbage'}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 404)
+
+        # positions with values of wrong types
+        for sort, position in (
+            ('price', ['abc', 1]),
+            ('-created', ['not a date', 1]),
+            ('-created', [['2020-01-01'], 1]),
+            ('-rating', [4.5, 'abc']),
+        ):
+            with self.subTest(sort=sort, position=position):
+                response = self.client.get(
+                    '/api/catalog/',
+                    {
+                        'sort': sort,
+                        'cursor': CatalogCursorPaginator.encode_cursor(
+                            2, position
+                        ),
+                    },
+                    headers=self.headers,
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_total_count_is_cached(self):
+        self.client.get('/api/catalog/', {'page': 1}, headers=self.headers)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(
+                '/api/catalog/', {'page': 2}, headers=self.headers
+            )
+        self.assertFalse(
+            any('COUNT(' in q['sql'] for q in context.captured_queries)
+        )
+
+
+class CatalogSearchTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        cls.by_title = Product.objects.create(
+            title='Ноутбук DEXP', category=category
+        )
+        cls.by_tag = Product.objects.create(
+            title='Монитор', category=category
+        )
+        cls.by_tag.tags.add(Tag.objects.create(name='ноутбуки'))
+        cls.by_spec = Product.objects.create(
+            title='Колонка', category=category, fullDescription='Для всех'
+        )
+        cls.by_spec.specifications.add(
+            Specification.objects.create(name='совместимость', value='ноутбук')
+        )
+        Product.objects.create(title='Телефон', category=category)
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, text: str, **params) -> list[int]:
+        clear_caches()
+        response = self.client.get(
+            '/api/catalog/', {'filter': text, **params}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['items']]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(
+            self.search('ноутб'),
+            [self.by_title.pk, self.by_tag.pk, self.by_spec.pk],
+        )
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('ноутбук dexp'), [self.by_title.pk])
+        self.assertEqual(self.search('ноутбук телефон'), [])
+
+    def test_sort_overrides_rank(self):
+        self.assertEqual(
+            self.search('ноутб', sort='-created'),
+            [self.by_spec.pk, self.by_tag.pk, self.by_title.pk],
+        )
+
+    def test_documents_follow_keyword_changes(self):
+        tag = self.by_tag.tags.get()
+        tag.name = 'дисплеи'
+        tag.save()
+        self.assertEqual(self.search('диспл'), [self.by_tag.pk])
+
+        self.by_tag.tags.clear()
+        self.assertEqual(self.search('диспл'), [])
+
+
+class ProductSuggestTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='category')
+        cls.notebook = Product.objects.create(
+            title='Ноутбук DEXP Aquilon', category=category
+        )
+        cls.monitor = Product.objects.create(
+            title='Монитор DEXP', category=category
+        )
+        Product.objects.create(
+            title='Ноутбук старый', category=category, is_active=False
+        )
+        cls.tag = Tag.objects.create(name='ноутбуки')
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+
+    def setUp(self):
+        suggestions.clear()
+
+    def suggest(self, text: str) -> dict:
+        response = self.client.get(
+            '/api/products/suggest/', {'q': text}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_of_any_word(self):
+        data = self.suggest('ноут')
+        self.assertEqual(
+            [p['id'] for p in data['products']], [self.notebook.pk]
+        )
+        self.assertEqual(data['tags'], [{'id': self.tag.pk, 'name': 'ноутбуки'}])
+        self.assertEqual(
+            {p['id'] for p in self.suggest('dexp')['products']},
+            {self.notebook.pk, self.monitor.pk},
+        )
+
+    def test_suggestions_do_not_query_database(self):
+        self.suggest('ноут')
+        with self.assertNumQueries(0):
+            suggestions.suggest('ноут')
+
+    def test_index_is_updated_incrementally(self):
+        self.suggest('ноут')
+
+        self.monitor.title = 'Ноутбук-трансформер'
+        self.monitor.save()
+        self.assertEqual(len(self.suggest('ноутбук-т')['products']), 1)
+
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            '/admin/catalog/product/',
+            {
+                'action': 'deactivate',
+                '_selected_action': [self.notebook.pk, self.monitor.pk],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.suggest('ноут')['products'], [])
+
+        self.tag.delete()
+        self.assertEqual(self.suggest('ноут')['tags'], [])
+
+
+class ResponseCacheTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='category')
+        cls.product = Product.objects.create(
+            title='product', category=cls.category, price=100
+        )
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, url: str):
+        response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def catalog_queries(self, url: str) -> list[str]:
+        """Return queries to catalog tables made on getting url"""
+        with CaptureQueriesContext(connection) as context:
+            self.get(url)
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'catalog_' in query['sql']
+        ]
+
+    def test_responses_are_cached(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.get(url)
+        self.assertEqual(self.catalog_queries(url), [])
+
+    def test_product_change_invalidates_responses(self):
+        detail_url = f'/api/products/{self.product.pk}/'
+        self.assertEqual(self.get(detail_url)['price'], 100.0)
+        self.assertEqual(self.get('/api/catalog/')['items'][0]['price'], 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 150
+            self.product.save()
+            # responses are invalidated only when the change is committed
+            self.assertEqual(self.get(detail_url)['price'], 100.0)
+
+        self.assertEqual(self.get(detail_url)['price'], 150.0)
+        self.assertEqual(self.get('/api/catalog/')['items'][0]['price'], 150.0)
+
+    def test_admin_deactivation_invalidates_responses(self):
+        self.assertEqual(len(self.get('/api/catalog/')['items']), 1)
+
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/admin/catalog/product/',
+                {
+                    'action': 'deactivate',
+                    '_selected_action': [self.product.pk],
+                },
+            )
+        self.assertEqual(len(self.get('/api/catalog/')['items']), 0)
+
+    def test_responses_are_invalidated_by_resource(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='tag')
+        self.assertEqual(self.get('/api/tags/')[0]['name'], 'tag')
+        self.assertNotEqual(self.catalog_queries(url), [])
+
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Product.objects.create(
+                title='other', category=self.category
+            )
+        self.assertEqual(self.catalog_queries(url), [])
+        self.assertEqual(self.get(f'/api/products/{other.pk}/')['id'], other.pk)
+
+
+class ResponseCacheStampedeTest(ApiTestCase):
+    key = 'test-key'
+
+    def setUp(self):
+        clear_caches()
+
+    def test_single_flight_recomputation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'data'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    response_cache.get_or_set(self.key, compute)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['data'] * 5)
+
+    def test_stale_data_is_served_during_recomputation(self):
+        response_cache.set(self.key, 'stale')
+        expired = time.time() + response_cache.get_timeout() + 1
+        with mock.patch('api.cache.time.time', return_value=expired):
+            # another worker is recomputing the data
+            response_cache.cache.add(f'api-lock:{self.key}', 1)
+            self.assertEqual(
+                response_cache.get_or_set(self.key, lambda: 'fresh'), 'stale'
+            )
+
+            response_cache.cache.delete(f'api-lock:{self.key}')
+            self.assertEqual(
+                response_cache.get_or_set(self.key, lambda: 'fresh'), 'fresh'
+            )
+
+    def test_early_expiration(self):
+        # computation took much time, so data could be recomputed early
+        response_cache.set(self.key, 'data', delta=1e4)
+        with mock.patch('api.cache.random.random', return_value=0.0):
+            self.assertEqual(
+                response_cache.get_or_set(self.key, lambda: 'new'), 'data'
+            )
+        with mock.patch('api.cache.random.random', return_value=0.9999):
+            self.assertEqual(
+                response_cache.get_or_set(self.key, lambda: 'new'), 'new'
+            )
+
+
+class FastJSONRendererTest(ApiTestCase):
+    headers = {'X-HERE-I-AM': 'hello'}
+    renders_amount = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='buyer')
+        profile = Profile.objects.create(user=cls.user)
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        category = Category.objects.create(title='категория')
+        tag = Tag.objects.create(name='тег')
+        today = timezone.localdate()
+        products = Product.objects.bulk_create(
+            Product(
+                title=f'товар {num}',
+                category=category,
+                price=Decimal('100.10') + num,
+                fullDescription='line\u2028separated',
+            )
+            for num in range(40)
+        )
+        for product in products:
+            product.tags.add(tag)
+            # images are stored under hash names, which look like
+            # floats in exponent notation, e.g. `...afc460e55b...`
+            name = sha1(product.title.encode()).hexdigest()
+            ProductImage.objects.create(
+                product=product, image=f'products/{name}.jpg'
+            )
+            Review.objects.create(product=product, rate=4, text='хорошо')
+            ProductOffer.objects.create(
+                product=product, salePrice=Decimal('99.99'),
+                dateFrom=today, dateTo=today,
+            )
+        for _ in range(20):
+            order = Order.objects.create(
+                buyer=profile, deliveryType=delivery, status='accepted'
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, price=product.price)
+                for product in products[:10]
+            )
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(self.user)
+
+    def get_payloads(self) -> dict:
+        payloads = {}
+        for url in ('/api/catalog/', '/api/sales/', '/api/orders/'):
+            response = self.client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            payloads[url] = response.data
+        return payloads
+
+    def test_output_is_the_same_as_output_of_json_renderer(self):
+        payloads = {
+            **self.get_payloads(),
+            'values': {
+                1: timezone.now(),
+                'date': timezone.localdate(),
+                'decimal': Decimal('0.1'),
+                'lazy': gettext_lazy('regular'),
+                'big': 2 ** 70,
+            },
+            'large decimal': {'price': Decimal('12345678901234567890.00')},
+            'large float': [1e16, -1.5e17],
+            'small float': [1e-7, 1e-05, 0.0001],
+            'nested floats': {'values': [(0.5, {'small': 1e-5})]},
+            'exponent-like strings': ['0.00001', '1e-07', 'afc460e55b'],
+        }
+        for name, data in payloads.items():
+            with self.subTest(payload=name):
+                self.assertEqual(
+                    FastJSONRenderer().render(data),
+                    JSONRenderer().render(data),
+                )
+
+        for value in (
+            Decimal('NaN'), Decimal('Infinity'), float('nan'), float('inf')
+        ):
+            for renderer in (FastJSONRenderer(), JSONRenderer()):
+                with self.subTest(value=value, renderer=renderer):
+                    with self.assertRaises(ValueError):
+                        renderer.render({'price': value})
+
+    def test_strings_like_floats_are_rendered_by_orjson(self):
+        payloads = self.get_payloads()
+        with mock.patch.object(JSONRenderer, 'render') as render:
+            for data in payloads.values():
+                FastJSONRenderer().render(data)
+        render.assert_not_called()
+
+    def test_pretty_printed_output(self):
+        data = self.get_payloads()['/api/orders/']
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    def measure(self, renderer, data) -> float:
+        start = time.perf_counter()
+        for _ in range(self.renders_amount):
+            renderer.render(data)
+        return time.perf_counter() - start
+
+    @benchmark
+    def test_render_time(self):
+        """
+        Benchmark of rendering of catalog and orders payloads
+        """
+        for url, data in self.get_payloads().items():
+            with self.subTest(url=url):
+                self.assertLess(
+                    self.measure(FastJSONRenderer(), data),
+                    self.measure(JSONRenderer(), data),
+                )
+
+
+class QueryPlanTest(ApiTestCase):
+    """
+    Querysets of API views should be served by indexes,
+    `EXPLAIN` of each of them is checked for the expected index
+    and for sequential scans, tables are analyzed, so the planner
+    chooses plans with default settings as it does in production
+    """
+    # index expected in the query plan of the first page of each url,
+    # None is lookup by primary key
+    indexes = {
+        '/api/products/limited/': 'product_active_limited',
+        '/api/banners/': 'product_active_stock',
+        '/api/catalog/': 'product_purchases',
+        '/api/products/popular/': 'product_rating',
+        '/api/products/{product}/': None,
+        '/api/catalog/?sort=price': 'product_active_price',
+        '/api/catalog/?sort=-created': 'product_active_created',
+        '/api/catalog/?sort=-reviews': 'product_reviews',
+        '/api/catalog/?sort=-rating': 'product_rating',
+        '/api/catalog/?minPrice=10&maxPrice=20&sort=price':
+            'product_active_price',
+        '/api/catalog/?category={category}': 'catalog_product_category_id',
+        '/api/sales/': 'offer_active_period',
+        '/api/orders/': 'order_buyer_status',
+        '/api/orders/{order}/': None,
+    }
+    # tags and categories are small and mostly active, so they are
+    # read whole, their partial indexes were dropped as useless
+    scanned = ('/api/tags/', '/api/categories/', '/api/categories/tree/')
+    # marker of primary key lookup (None above) in query plans of vendors
+    primary_keys = {'sqlite': 'PRIMARY KEY', 'postgresql': '_pkey'}
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        users = User.objects.bulk_create(
+            User(username=f'buyer {num}') for num in range(200)
+        )
+        profiles = Profile.objects.bulk_create(
+            Profile(user=user) for user in users
+        )
+        cls.user = users[0]
+        delivery = DeliveryType.objects.create(type='regular', cost=200)
+        categories = Category.objects.bulk_create(
+            Category(title=f'category {num}', is_active=bool(num % 5))
+            for num in range(100)
+        )
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    title=f'product {num}',
+                    category=categories[num % 100],
+                    price=num % 500,
+                    stock=num % 7,
+                    is_limited=not num % 13,
+                    is_active=bool(num % 5),
+                    rating_avg=num % 50 / 10,
+                    reviews_count=num % 30,
+                )
+                for num in range(5000)
+            ),
+            batch_size=1000,
+        )
+        ProductOffer.objects.bulk_create(
+            ProductOffer(
+                product=product, salePrice=1,
+                dateFrom=today - timedelta(days=num % 30),
+                dateTo=today + timedelta(days=num % 30 - 15),
+                is_active=bool(num % 4),
+            )
+            for num, product in enumerate(products[::5])
+        )
+        orders = Order.objects.bulk_create(
+            Order(buyer=profile, deliveryType=delivery, status=status)
+            for profile in profiles
+            for status in ('accepted', 'paid', 'awaiting payment', 'paid')
+        )
+        OrderItem.objects.bulk_create(
+            (
+                OrderItem(order=order, product=product, price=product.price)
+                for num, order in enumerate(orders)
+                for product in products[num % 100:num % 100 + 3]
+            ),
+            batch_size=1000,
+        )
+        CategoryClosure.objects.rebuild()
+        Product.objects.rebuild_purchases()
+        # collect statistics of tables for the planner
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.params = {
+            'product': products[1].pk,
+            'category': categories[1].pk,
+            'order': orders[0].pk,
+        }
+
+    def get_queryset(self, url: str):
+        path, _, query = url.format(**self.params).partition('?')
+        match = resolve(path)
+        view = match.func.view_class()
+        request = RequestFactory().get(path, QueryDict(query))
+        request.user = self.user
+        view.setup(request, *match.args, **match.kwargs)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        queryset = view.filter_queryset(view.get_queryset())
+        if values_serializer := getattr(view, 'values_serializer_class', None):
+            queryset = values_serializer.get_values(queryset)
+        if 'pk' in match.kwargs:
+            queryset = queryset.filter(pk=match.kwargs['pk'])
+        elif view.paginator is not None:
+            # the first page is explained as it is queried
+            queryset = queryset[:view.paginator.page_size]
+        return queryset
+
+    def get_sequential_scans(self, queryset) -> list[str]:
+        """Return lines of query plan of queryset scanning whole tables"""
+        # small joined tables are scanned anyway, only the table
+        # of the queryset is checked
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            return [
+                line for line in queryset.explain().splitlines()
+                if f'Seq Scan on {table} ' in f'{line} '
+            ]
+        if connection.vendor == 'sqlite':
+            # `SCAN <table>` without `USING INDEX` reads the whole table
+            return [
+                line for line in queryset.explain().splitlines()
+                if re.search(rf'\bSCAN {table}$', line)
+            ]
+        self.skipTest(f'query plans of {connection.vendor} are not checked')
+
+    def test_querysets_of_api_views_use_indexes(self):
+        for url, index in self.indexes.items():
+            with self.subTest(url=url):
+                queryset = self.get_queryset(url)
+                self.assertEqual(self.get_sequential_scans(queryset), [])
+                self.assertIn(
+                    index or self.primary_keys[connection.vendor],
+                    queryset.explain(),
+                )
+
+    def test_taxonomy_tables_are_read_whole(self):
+        for url in self.scanned:
+            with self.subTest(url=url):
+                queryset = self.get_queryset(url)
+                self.assertEqual(len(self.get_sequential_scans(queryset)), 1)
+
+    def test_order_of_buyer_is_found_by_status(self):
+        queryset = Order.objects.filter(
+            buyer=self.user.profile, status='accepted'
+        )
+        self.assertEqual(self.get_sequential_scans(queryset), [])
+        self.assertIn('order_buyer_status', queryset.explain())
+
+
+class SeedShopTest(ApiTestCase):
+    options = {
+        'categories': 5,
+        'tags': 10,
+        'specifications': 10,
+        'products': 30,
+        'users': 3,
+        'orders': 20,
+        'batch_size': 7,
+        'seed': 42,
+    }
+
+    def seed(self, **options):
+        options = {**self.options, **options}
+        call_command('seedshop', **options, stdout=StringIO())
+
+    def get_snapshot(self) -> dict:
+        return {
+            'products': list(
+                Product.objects.order_by('pk').values_list(
+                    'pk', 'title', 'price', 'stock', 'category', 'is_active',
+                    'rating_sum', 'reviews_count',
+                )
+            ),
+            'tags': list(
+                Product.tags.through.objects
+                .order_by('product', 'tag')
+                .values_list('product', 'tag')
+            ),
+            'offers': list(
+                ProductOffer.objects
+                .order_by('product')
+                .values_list('product', 'salePrice', 'dateFrom', 'dateTo')
+            ),
+            'orders': list(
+                Order.objects.order_by('pk').values_list(
+                    'pk', 'buyer', 'status', 'deliveryType__type',
+                    'total_cost',
+                )
+            ),
+            'items': list(
+                OrderItem.objects
+                .order_by('order', 'product')
+                .values_list('order', 'product', 'quantity', 'price')
+            ),
+        }
+
+    def test_same_seed_gives_same_data(self):
+        with transaction.atomic():
+            self.seed()
+            snapshot = self.get_snapshot()
+            # the data is generated again from scratch
+            transaction.set_rollback(True)
+
+        self.seed()
+        self.assertEqual(self.get_snapshot(), snapshot)
+        stocks = [row[3] for row in snapshot['products']]
+        self.seed(seed=1)
+        self.assertNotEqual(
+            list(
+                Product.objects
+                .order_by('pk')
+                .values_list('stock', flat=True)[30:]
+            ),
+            stocks,
+        )
+
+    def test_derived_data_is_rebuilt(self):
+        self.seed()
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(Profile.objects.count(), 3)
+
+        reviews = dict(
+            Review.objects.values('product')
+            .annotate(amount=Count('pk'))
+            .values_list('product', 'amount')
+        )
+        for pk, reviews_count in Product.objects.values_list(
+            'pk', 'reviews_count'
+        ):
+            self.assertEqual(reviews_count, reviews.get(pk, 0))
+        for order in Order.objects.all():
+            self.assertEqual(
+                order.items_cost,
+                sum(item.price * item.quantity
+                    for item in order.purchases.all()),
+            )
+            self.assertGreater(order.total_cost, 0)
+
+        roots = Category.objects.exclude(
+            pk__in=Category.subcategories.through.objects
+            .values('to_category')
+        )
+        self.assertEqual(
+            sum(roots.values_list('products_count', flat=True)),
+            Product.objects.filter(is_active=True).count(),
+        )
+        self.assertEqual(
+            ProductSearchDocument.objects.count(), Product.objects.count()
+        )
+        # sequences of primary keys are moved past generated rows
+        Product.objects.create(
+            title='new', category=Category.objects.first()
+        )
+
+    def test_orders_need_products_and_users(self):
+        with self.assertRaises(CommandError):
+            self.seed(users=0)
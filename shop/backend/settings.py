@@ -84,6 +84,10 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
@@ -93,10 +97,49 @@ REST_FRAMEWORK = {
 
 CART_SESSION_ID = 'cart'
 
+# text search configuration of PostgreSQL used by product search
+CATALOG_SEARCH_CONFIG = 'russian'
+
+# seconds after which in-memory suggestions index is fully rebuilt
+SUGGEST_INDEX_TTL = 60 * 5
+
+# max amount of products matching selected facets which are filtered
+# by ids, larger selections are filtered by database (see catalog.facets)
+FACET_FILTER_MAX_IDS = 10000
+
+# seconds during which stock is reserved for order awaiting payment
+STOCK_RESERVATION_TTL = 60 * 15
+
+# seconds between releases of expired stock reservations by the thread
+# started within the web process (see purchase.sweeper), None disables it,
+# then `manage.py releasereservations` should be scheduled instead
+STOCK_RESERVATION_SWEEP_INTERVAL = None
+
+# seconds after which request with idempotency key still in progress
+# is considered abandoned, so the key could be claimed again
+IDEMPOTENCY_KEY_TIMEOUT = 60
+
+# seconds during which responses of requests with idempotency keys
+# are stored, expired keys are purged by the sweeper thread only if
+# STOCK_RESERVATION_SWEEP_INTERVAL is set, otherwise
+# `manage.py purgeidempotencykeys` should be scheduled
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# alias of cache shared between processes for API responses (see api.cache),
+# Redis is used if REDIS_URL is set (requires `redis` package)
+API_CACHE_ALIAS = 'api'
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     },
+    API_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv('REDIS_URL'),
+    } if os.getenv('REDIS_URL') else {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / 'cache',
+    },
 }
 
 ROOT_URLCONF = 'backend.urls'
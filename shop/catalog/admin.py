@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
 
 from catalog.models import (
     Category,
@@ -24,7 +25,12 @@ class ProductOfferAdmin(SoftDeleteMixin, admin.ModelAdmin):
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
-    pass
+    """
+    Review stats of products are updated by `catalog.signals`
+    on every save and delete, bulk deletion included
+    """
+    list_display = ('product', 'author', 'rate', 'date')
+    list_select_related = ('product',)
 
 
 class SubcategoriesInline(admin.TabularInline):
@@ -39,6 +45,7 @@ class SubcategoriesInline(admin.TabularInline):
 class CategoryAdmin(SoftDeleteMixin, admin.ModelAdmin):
     filter_horizontal = ('subcategories',)
     inlines = [SubcategoriesInline]
+    list_display = ('title', 'products_count', 'is_active')
 
 
 class ProductImagesInline(admin.TabularInline):
@@ -53,6 +60,7 @@ class ProductAdmin(SoftDeleteMixin, admin.ModelAdmin):
     list_editable = ['price', 'stock']
     filter_horizontal = 'tags', 'specifications'
     exclude = ('count',)
+    readonly_fields = ('rating_avg', 'reviews_count', 'purchases_count')
     search_fields = ('title', 'fullDescription')
     list_filter = ('is_active', 'is_limited')
     prepopulated_fields = {"slug": ("title",)}
@@ -0,0 +1,202 @@
+"""
+This module contains in-memory inverted index of facets of active
+products (active tags and specifications) used for faceted filtering
+of catalog (api/catalog/) and facet counts (api/catalog/facets/).
+
+Every facet keeps bitset of ids of its products (python int),
+so selected facets narrow results by intersection of bitsets
+and counts of facets are popcounts of intersections.
+Facets of the same group are combined with OR
+(any of selected tags, any of selected values of a specification),
+groups are combined with AND.
+
+Index of each process is built from database for a version
+of `facets` resource of the shared response cache (see `api.cache`),
+the version is changed by `api.signals` when products, their tags
+or specifications are changed in any process, then the index is rebuilt
+on next use. Responses using the index depend on the same resource,
+so they are never cached with an index older than their key.
+
+Selections matching more than `settings.FACET_FILTER_MAX_IDS` products
+are filtered by database with `EXISTS` subqueries instead of passing
+ids of products in `IN` clause.
+"""
+
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models
+
+from catalog.models import Product
+
+TAG = 'tag'
+SPECIFICATION = 'specification'
+
+
+def to_bitset(ids) -> int:
+    """Return bitset with bits of given ids set"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        data[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(data, 'little')
+
+
+def to_ids(bitset: int) -> list[int]:
+    """Return ids of set bits of bitset in ascending order"""
+    ids = []
+    data = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+    for position, byte in enumerate(data):
+        while byte:
+            lowest = byte & -byte
+            ids.append(position * 8 + lowest.bit_length() - 1)
+            byte ^= lowest
+    return ids
+
+
+class FacetIndex:
+    """
+    Bitsets of products of facets, facet is (`tag`, name)
+    or (`specification`, name, value), group of facet is the facet
+    without the last item
+    """
+
+    def __init__(self):
+        self._bitsets: dict[tuple, int] = {}
+        self.version = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get_products(cls) -> dict[tuple, list[int]]:
+        """Return ids of active products of each facet"""
+        products = Product.objects.filter(is_active=True)
+        facets = defaultdict(list)
+        for pk, name in (
+            Product.tags.through.objects
+            .filter(product__in=products, tag__is_active=True)
+            .values_list('product', 'tag__name')
+        ):
+            facets[(TAG, name)].append(pk)
+        for pk, name, value in (
+            Product.specifications.through.objects
+            .filter(product__in=products, specification__is_active=True)
+            .values_list(
+                'product', 'specification__name', 'specification__value'
+            )
+        ):
+            facets[(SPECIFICATION, name, value)].append(pk)
+        return facets
+
+    def clear(self) -> None:
+        """Drop content of the index, it will be rebuilt on next use"""
+        with self._lock:
+            self._bitsets = {}
+            self.version = None
+
+    def build(self, version: str) -> None:
+        """Load facets of active products from database"""
+        bitsets = {
+            facet: to_bitset(ids)
+            for facet, ids in self.get_products().items()
+        }
+        with self._lock:
+            self._bitsets = bitsets
+            self.version = version
+
+    def ensure_built(self, version: str) -> None:
+        """Rebuild the index if it is built for another version"""
+        with self._lock:
+            if self.version != version:
+                self.build(version)
+
+    @classmethod
+    def group_facets(cls, facets) -> dict[tuple, list[tuple]]:
+        groups = defaultdict(list)
+        for facet in facets:
+            groups[facet[:-1]].append(facet)
+        return groups
+
+    @classmethod
+    def get_condition(cls, facets) -> models.Q:
+        """
+        Return condition of products having any facet of each group
+        of given facets, which is checked by database
+        """
+        condition = models.Q()
+        for group, group_facets in cls.group_facets(facets).items():
+            if group[0] == TAG:
+                rows = Product.tags.through.objects.filter(
+                    tag__is_active=True,
+                    tag__name__in=[facet[1] for facet in group_facets],
+                )
+            else:
+                rows = Product.specifications.through.objects.filter(
+                    specification__is_active=True,
+                    specification__name=group[1],
+                    specification__value__in=[
+                        facet[2] for facet in group_facets
+                    ],
+                )
+            condition &= models.Exists(
+                rows.filter(product=models.OuterRef('pk'))
+            )
+        return condition
+
+    def match(self, facets, exclude_group: tuple | None = None) -> int | None:
+        """
+        Return bitset of products having any facet of each group
+        of given facets, None if there are no facets to match
+        """
+        result = None
+        for group, group_facets in self.group_facets(facets).items():
+            if group == exclude_group:
+                continue
+            bitset = 0
+            for facet in group_facets:
+                bitset |= self._bitsets.get(facet, 0)
+            result = bitset if result is None else result & bitset
+        return result
+
+    def get_filter(self, facets, version: str) -> models.Q | None:
+        """
+        Return condition of products matching given facets,
+        None if there are no facets to match
+        """
+        if not facets:
+            return None
+        self.ensure_built(version)
+        with self._lock:
+            bitset = self.match(facets)
+        if bitset.bit_count() > settings.FACET_FILTER_MAX_IDS:
+            return self.get_condition(facets)
+        return models.Q(pk__in=to_ids(bitset))
+
+    def count(self, product_ids, facets, version: str) -> dict[tuple, int]:
+        """
+        Return amount of given products matching each facet
+        together with selected facets of other groups, selected facets
+        are counted even if they have no products
+        """
+        self.ensure_built(version)
+        products = to_bitset(product_ids)
+        counts = {}
+        with self._lock:
+            group_bitsets = {}
+            for facet, bitset in self._bitsets.items():
+                group = facet[:-1]
+                if group not in group_bitsets:
+                    selected = self.match(facets, exclude_group=group)
+                    group_bitsets[group] = (
+                        products if selected is None else products & selected
+                    )
+                if amount := (bitset & group_bitsets[group]).bit_count():
+                    counts[facet] = amount
+        for facet in facets:
+            counts.setdefault(facet, 0)
+        return counts
+
+
+facets = FacetIndex()
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from catalog.models import Category, CategoryClosure
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild closure table of category tree '
+        'and amounts of active products of categories'
+    )
+
+    def handle(self, *args, **options):
+        paths = CategoryClosure.objects.rebuild()
+        Category.objects.update_products_count()
+        self.stdout.write(
+            self.style.SUCCESS(f'Category tree rebuilt with {paths} paths')
+        )
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recalculate amounts of sold items of all products'
+
+    def handle(self, *args, **options):
+        updated = Product.objects.rebuild_purchases()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Purchases of {updated} products rebuilt')
+        )
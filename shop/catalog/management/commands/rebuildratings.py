@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recalculate review stats (sum of rates, amount of reviews, ' \
+           'average rating) of all products'
+
+    def handle(self, *args, **options):
+        updated = Product.objects.rebuild_review_stats()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Review stats of {updated} products rebuilt')
+        )
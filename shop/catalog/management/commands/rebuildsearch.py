@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from catalog.models import Product
+from catalog.search import update_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild search documents of all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='amount of products processed at once',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+
+        updated = 0
+        for start in range(0, len(product_ids), batch_size):
+            updated += update_search_documents(
+                product_ids[start:start + batch_size], batch_size
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Search documents of {updated} products rebuilt')
+        )
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 08:07
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def fill_review_stats(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    Review = apps.get_model('catalog', 'Review')
+    reviews = (
+        Review.objects
+        .filter(product=models.OuterRef('pk'))
+        .order_by()
+        .values('product')
+    )
+    Product.objects.update(
+        rating_sum=Coalesce(
+            models.Subquery(
+                reviews.annotate(total=models.Sum('rate')).values('total')
+            ),
+            0,
+        ),
+        reviews_count=Coalesce(
+            models.Subquery(
+                reviews.annotate(amt=models.Count('pk')).values('amt')
+            ),
+            0,
+        ),
+    )
+    Product.objects.update(
+        rating_avg=Coalesce(
+            Cast('rating_sum', models.FloatField())
+            / NullIf('reviews_count', 0),
+            0.0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_product_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False, help_text='average rate of reviews of the product', verbose_name='rating'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='sum of rates of all reviews of the product', verbose_name='sum of rates'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='amount of reviews of the product', verbose_name='amount of reviews'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('rating_avg'), name='product_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('reviews_count'), name='product_reviews'),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 08:11
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_vector_index(apps, schema_editor):
+    # GIN index is PostgreSQL-only, other databases use portable search
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX catalog_search_vector '
+            'ON catalog_productsearchdocument USING gin (vector)'
+        )
+
+
+def drop_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS catalog_search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='catalog.product', verbose_name='product')),
+                ('title', models.TextField(default='', verbose_name='title')),
+                ('tags', models.TextField(default='', verbose_name='tags')),
+                ('body', models.TextField(default='', verbose_name='text')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='search vector')),
+            ],
+            options={
+                'verbose_name': 'search document',
+                'verbose_name_plural': 'search documents',
+            },
+        ),
+        migrations.RunPython(create_vector_index, drop_vector_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2 on 2026-10-18 08:42
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_category_tree(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    CategoryClosure = apps.get_model('catalog', 'CategoryClosure')
+    Product = apps.get_model('catalog', 'Product')
+
+    children = {}
+    for parent_id, child_id in (
+        Category.subcategories.through.objects
+        .values_list('from_category', 'to_category')
+    ):
+        children.setdefault(parent_id, []).append(child_id)
+
+    rows = []
+    for category_id in Category.objects.values_list('pk', flat=True):
+        depths = {category_id: 0}
+        level = [category_id]
+        while level:
+            next_level = []
+            for node in level:
+                for child in children.get(node, ()):
+                    if child not in depths:
+                        depths[child] = depths[node] + 1
+                        next_level.append(child)
+            level = next_level
+        rows.extend(
+            CategoryClosure(
+                ancestor_id=category_id, descendant_id=descendant, depth=depth
+            )
+            for descendant, depth in depths.items()
+        )
+    CategoryClosure.objects.bulk_create(rows, batch_size=1000)
+
+    products = (
+        Product.objects
+        .filter(
+            is_active=True,
+            category__ancestor_links__ancestor=models.OuterRef('pk'),
+        )
+        .order_by()
+        .annotate(amount=models.Func('pk', function='COUNT'))
+        .values('amount')
+    )
+    Category.objects.update(
+        products_count=Coalesce(models.Subquery(products), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='amount of active products of the category and its descendants', verbose_name='amount of products'),
+        ),
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(default=0, verbose_name='depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='catalog.category', verbose_name='ancestor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='catalog.category', verbose_name='descendant')),
+            ],
+            options={
+                'verbose_name': 'category tree path',
+                'verbose_name_plural': 'category tree paths',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='category_closure_path'),
+        ),
+        migrations.RunPython(fill_category_tree, migrations.RunPython.noop),
+    ]
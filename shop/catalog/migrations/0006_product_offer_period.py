@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productoffer',
+            index=models.Index(models.F('is_active'), models.F('dateTo'), models.F('dateFrom'), name='offer_active_period'),
+        ),
+    ]
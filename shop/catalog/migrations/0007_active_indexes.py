@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_product_offer_period'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='title',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_rating',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_reviews',
+        ),
+        migrations.RemoveIndex(
+            model_name='productoffer',
+            name='offer_active_period',
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(models.F('title'), condition=models.Q(('is_active', True)), name='category_active'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('stock'), condition=models.Q(('is_active', True)), name='product_active_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('stock'), condition=models.Q(('is_active', True), ('is_limited', True)), name='product_active_limited'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('price'), condition=models.Q(('is_active', True)), name='product_active_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('created_at'), condition=models.Q(('is_active', True)), name='product_active_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('rating_avg'), condition=models.Q(('is_active', True)), name='product_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('reviews_count'), condition=models.Q(('is_active', True)), name='product_reviews'),
+        ),
+        migrations.AddIndex(
+            model_name='productoffer',
+            index=models.Index(models.F('dateTo'), models.F('dateFrom'), condition=models.Q(('is_active', True)), name='offer_active_period'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(models.F('name'), condition=models.Q(('is_active', True)), name='tag_active'),
+        ),
+    ]
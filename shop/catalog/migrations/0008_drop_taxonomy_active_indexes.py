@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 09:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_active_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_active',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='tag_active',
+        ),
+    ]
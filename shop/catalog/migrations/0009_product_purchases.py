@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 09:51
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_purchases(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    OrderItem = apps.get_model('purchase', 'OrderItem')
+    order_items = (
+        OrderItem.objects
+        .filter(product=models.OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=models.Sum('quantity'))
+        .values('total')
+    )
+    Product.objects.update(
+        purchases_count=Coalesce(models.Subquery(order_items), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_drop_taxonomy_active_indexes'),
+        ('purchase', '0008_idempotency_key_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='purchases_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='amount of sold items of the product', verbose_name='amount of purchases'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('purchases_count'), condition=models.Q(('is_active', True)), name='product_purchases'),
+        ),
+        migrations.RunPython(fill_purchases, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.contrib import admin
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.shortcuts import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
@@ -11,6 +14,136 @@ from catalog.service import (
     random_category_image,
 )
 
+# condition of partial indexes of soft-deleted models
+ACTIVE = models.Q(is_active=True)
+
+
+class ProductQuerySet(models.QuerySet):
+    """QuerySet of the Product model"""
+
+    def with_listing_data(self):
+        """
+        Return queryset prepared for serialization of product listings.
+        Category is joined, images, tags and specifications are prefetched,
+        so the amount of queries doesn't depend on the amount of products
+        """
+        return (
+            self.select_related('category')
+            .prefetch_related('images', 'tags', 'specifications')
+        )
+
+    def add_purchases(self, quantities: dict[int, int]) -> int:
+        """
+        Shift amounts of sold items of products by given quantities
+        (by ids of products) with single UPDATE
+        """
+        if not quantities:
+            return 0
+        return self.filter(pk__in=quantities).update(
+            purchases_count=models.F('purchases_count') + models.Case(
+                *(
+                    models.When(pk=pk, then=models.Value(quantity))
+                    for pk, quantity in quantities.items()
+                ),
+                default=0,
+            )
+        )
+
+    def rebuild_purchases(self) -> int:
+        """
+        Recalculate amounts of sold items of products in queryset
+        from scratch with correlated subquery of order items
+        """
+        order_items = (
+            self.model._meta.get_field('purchases').related_model.objects
+            .filter(product=models.OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(total=models.Sum('quantity'))
+            .values('total')
+        )
+        return self.update(
+            purchases_count=Coalesce(models.Subquery(order_items), 0)
+        )
+
+    def with_available_stock(self):
+        """
+        Annotate queryset with `_available` - stock of the product
+        which is not reserved by live reservations of unpaid orders
+        (see `purchase.models.StockReservation`)
+        """
+        reservations = (
+            self.model._meta.get_field('reservations').related_model.objects
+            .live()
+            .filter(product=models.OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(total=models.Sum('quantity'))
+            .values('total')
+        )
+        return self.annotate(
+            _available=(
+                models.F('stock')
+                - Coalesce(models.Subquery(reservations), 0)
+            )
+        )
+
+    def in_category(self, category_id: int):
+        """
+        Filter products of the category and all its descendants,
+        descendants are taken from `CategoryClosure` with subquery
+        """
+        return self.filter(
+            category__in=CategoryClosure.objects
+            .filter(ancestor=category_id)
+            .values('descendant')
+        )
+
+    def update_review_stats(self, rate_delta: int, amount_delta: int) -> int:
+        """
+        Shift sum of rates and amount of reviews of products in queryset
+        by given deltas and recalculate average rating in the same statement
+        """
+        rating_sum = models.F('rating_sum') + rate_delta
+        reviews_count = models.F('reviews_count') + amount_delta
+        return self.update(
+            rating_sum=rating_sum,
+            reviews_count=reviews_count,
+            rating_avg=Coalesce(
+                Cast(rating_sum, models.FloatField())
+                / NullIf(reviews_count, 0),
+                0.0,
+            ),
+        )
+
+    @transaction.atomic
+    def rebuild_review_stats(self) -> int:
+        """
+        Recalculate sum of rates, amount of reviews and average rating
+        of products in queryset from scratch
+        """
+        reviews = (
+            Review.objects
+            .filter(product=models.OuterRef('pk'))
+            .order_by()
+            .values('product')
+        )
+        self.update(
+            rating_sum=Coalesce(
+                models.Subquery(
+                    reviews.annotate(total=models.Sum('rate')).values('total')
+                ),
+                0,
+            ),
+            reviews_count=Coalesce(
+                models.Subquery(
+                    reviews.annotate(amt=models.Count('pk')).values('amt')
+                ),
+                0,
+            ),
+        )
+        return self.update_review_stats(0, 0)
+
 
 class Product(models.Model):
     """Model of the Product
@@ -34,6 +167,12 @@ class Product(models.Model):
             (catalog.models.Specification);
         `tags`: fk - link to product's tags (catalog.models.Tag);
         `is_limited`: boolean - defines whether product is limited;
+        `rating_sum`: integer - sum of rates of all product's reviews;
+        `reviews_count`: integer - amount of product's reviews;
+        `rating_avg`: float - average rate of product's reviews;
+            (last three are maintained by `catalog.signals`)
+        `purchases_count`: integer - amount of sold items of the product
+            (maintained by `purchase.signals`);
     properties:
         available;
         date;
@@ -121,11 +260,61 @@ class Product(models.Model):
         default=False,
         help_text=_('adds limited status to the product')
     )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('sum of rates'),
+        help_text=_('sum of rates of all reviews of the product')
+    )
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('amount of reviews'),
+        help_text=_('amount of reviews of the product')
+    )
+    rating_avg = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_('rating'),
+        help_text=_('average rate of reviews of the product')
+    )
+    purchases_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('amount of purchases'),
+        help_text=_('amount of sold items of the product')
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('product')
         verbose_name_plural = _('products')
-        indexes = (models.Index('title', name='title'),)
+        # listings show only active products, so indexes are partial
+        # (title is indexed by its unique constraint)
+        indexes = (
+            models.Index(
+                'stock', name='product_active_stock', condition=ACTIVE
+            ),
+            models.Index(
+                'stock',
+                name='product_active_limited',
+                condition=ACTIVE & models.Q(is_limited=True),
+            ),
+            models.Index(
+                'price', name='product_active_price', condition=ACTIVE
+            ),
+            models.Index(
+                'created_at', name='product_active_created', condition=ACTIVE
+            ),
+            models.Index('rating_avg', name='product_rating', condition=ACTIVE),
+            models.Index(
+                'reviews_count', name='product_reviews', condition=ACTIVE
+            ),
+            models.Index(
+                'purchases_count', name='product_purchases', condition=ACTIVE
+            ),
+        )
         ordering = ('stock',)
 
     def get_absolute_url(self):
@@ -136,12 +325,30 @@ class Product(models.Model):
             self.slug = slugify(self.title)
         return super().save(*args, **kwargs)
 
+    @property
+    def available_stock(self):
+        """
+        Return stock of the product which is not reserved by unpaid orders,
+        the value annotated by `ProductQuerySet.with_available_stock`
+        is used if there is one
+        """
+        if hasattr(self, '_available'):
+            return self._available
+        return (
+            Product.objects
+            .filter(pk=self.pk)
+            .with_available_stock()
+            .values_list('_available', flat=True)
+            .get()
+        )
+
     @property
     def available(self):
         """
-        Return True if stock of the product greater than zero otherwise False.
+        Return True if available stock of the product greater than zero
+        otherwise False.
         """
-        return self.stock > 0
+        return self.available_stock > 0
 
     @property
     def date(self):
@@ -162,22 +369,40 @@ class Product(models.Model):
     def rating(self):
         """
         Return average rating of the product based on reviews.
-        If there is no reviews to this product yet return `not rated yet`
-        """
-        try:
-            return round(
-                Review.objects.select_related('product')
-                .filter(product=self)
-                .aggregate(models.Avg('rate'))
-                .get('rate__avg'), 2
-            )
-        except TypeError:
-            return 0
+        If there is no reviews to this product yet return 0
+        """
+        return round(self.rating_avg, 2)
 
     def __str__(self):
         return self.title
 
 
+class ProductSearchDocument(models.Model):
+    """
+    Search document of the product, contains normalized text
+    of product's title, tags, description and specification values.
+    `vector` is filled on PostgreSQL only, see `catalog.search`
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name=_('product'),
+    )
+    title = models.TextField(default='', verbose_name=_('title'))
+    tags = models.TextField(default='', verbose_name=_('tags'))
+    body = models.TextField(default='', verbose_name=_('text'))
+    vector = SearchVectorField(null=True, verbose_name=_('search vector'))
+
+    class Meta:
+        verbose_name = _('search document')
+        verbose_name_plural = _('search documents')
+
+    def __str__(self):
+        return '{} {}'.format(self.product_id, _('search document'))
+
+
 class ProductImage(models.Model):
     """
     Image model for the product
@@ -221,6 +446,37 @@ class ProductImage(models.Model):
         return '{} {}'.format(self.product.title, _('image'))
 
 
+class CategoryQuerySet(models.QuerySet):
+    """QuerySet of the Category model"""
+
+    def ancestors_of(self, category_ids) -> 'CategoryQuerySet':
+        """Filter given categories and all their ancestors"""
+        return self.filter(
+            pk__in=CategoryClosure.objects
+            .filter(descendant__in=category_ids)
+            .values('ancestor')
+        )
+
+    def update_products_count(self) -> int:
+        """
+        Recalculate amount of active products of categories in queryset
+        and all their descendants in single statement
+        """
+        products = (
+            Product.objects
+            .filter(
+                is_active=True,
+                category__ancestor_links__ancestor=models.OuterRef('pk'),
+            )
+            .order_by()
+            .annotate(amount=models.Func('pk', function='COUNT'))
+            .values('amount')
+        )
+        return self.update(
+            products_count=Coalesce(models.Subquery(products), 0)
+        )
+
+
 class Category(models.Model):
     title = models.CharField(
         max_length=100, verbose_name=_('title'), unique=True
@@ -235,6 +491,16 @@ class Category(models.Model):
     )
 
     is_active = models.BooleanField(default=True, verbose_name=_('active'))
+    products_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('amount of products'),
+        help_text=_(
+            'amount of active products of the category and its descendants'
+        ),
+    )
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('category')
@@ -250,6 +516,86 @@ class Category(models.Model):
         return self.title
 
 
+class CategoryClosureQuerySet(models.QuerySet):
+    """QuerySet of the CategoryClosure model"""
+
+    @transaction.atomic
+    def rebuild(self) -> int:
+        """
+        Replace closure table with paths of current category tree,
+        return amount of rows
+        """
+        children = {}
+        for parent_id, child_id in (
+            Category.subcategories.through.objects
+            .values_list('from_category', 'to_category')
+        ):
+            children.setdefault(parent_id, []).append(child_id)
+
+        rows = []
+        for category_id in Category.objects.values_list('pk', flat=True):
+            # breadth-first search gives the shortest depth of descendants,
+            # cycles of the graph are cut by already visited categories
+            depths = {category_id: 0}
+            level = [category_id]
+            while level:
+                next_level = []
+                for node in level:
+                    for child in children.get(node, ()):
+                        if child not in depths:
+                            depths[child] = depths[node] + 1
+                            next_level.append(child)
+                level = next_level
+            rows.extend(
+                self.model(
+                    ancestor_id=category_id,
+                    descendant_id=descendant,
+                    depth=depth,
+                )
+                for descendant, depth in depths.items()
+            )
+
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class CategoryClosure(models.Model):
+    """
+    Closure table of category tree (`Category.subcategories`):
+    a row for each category and each of its descendants
+    (including the category itself with zero depth).
+    Rebuilt by `catalog.signals` on changing categories
+    """
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+        verbose_name=_('ancestor'),
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+        verbose_name=_('descendant'),
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0, verbose_name=_('depth')
+    )
+
+    objects = CategoryClosureQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('category tree path')
+        verbose_name_plural = _('category tree paths')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('ancestor', 'descendant'),
+                name='category_closure_path',
+            ),
+        )
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name=_('name'))
     is_active = models.BooleanField(default=True, verbose_name=_('active'))
@@ -285,6 +631,20 @@ class Review(models.Model):
         verbose_name = _('review')
         verbose_name_plural = _('reviews')
 
+    def save(self, *args, **kwargs):
+        """
+        Save review in one transaction with update of product's review stats
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete review in one transaction with update of product's review stats
+        """
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f'{self.product.title} review by {self.author}'
 
@@ -303,6 +663,22 @@ class Specification(models.Model):
         return f'Spec ({self.name}: {self.value})'
 
 
+class ProductOfferQuerySet(models.QuerySet):
+    """QuerySet of the ProductOffer model"""
+
+    def current(self, today=None):
+        """Filter active offers lasting today"""
+        today = today or timezone.localdate()
+        return self.filter(
+            is_active=True, dateFrom__lte=today, dateTo__gte=today
+        )
+
+    def upcoming(self, today=None):
+        """Filter active offers lasting today or starting later"""
+        today = today or timezone.localdate()
+        return self.filter(is_active=True, dateTo__gte=today)
+
+
 class ProductOffer(models.Model):
     dateFrom = models.DateField(verbose_name=_('start date'))
     dateTo = models.DateField(verbose_name=_('end date'))
@@ -320,9 +696,17 @@ class ProductOffer(models.Model):
     )
     is_active = models.BooleanField(default=True, verbose_name=_('active'))
 
+    objects = ProductOfferQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('product offer')
         verbose_name_plural = _('product offers')
+        indexes = (
+            models.Index(
+                'dateTo', 'dateFrom', name='offer_active_period',
+                condition=ACTIVE,
+            ),
+        )
 
     @admin.display(description=_('product title'))
     def product_title(self):
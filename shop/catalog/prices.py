@@ -0,0 +1,138 @@
+"""
+This module contains resolver of current prices of products.
+
+Current price of a product is the lowest sale price of its active offers
+lasting today or its regular price if there are no such offers.
+
+The next offer boundary - the nearest day when any active offer starts
+or ends - is taken with one aggregate query of offers which are not over
+yet (see `ProductOfferQuerySet.upcoming`) and is cached in shared
+`settings.API_CACHE_ALIAS` cache under its own small entry with a version
+of the current period. Sale prices are taken only for requested products
+with one query and cached per product under the version
+until the boundary, so prices of all products are never loaded.
+Saved, deleted and (de)activated offers drop the period entry,
+and so the prices of its version (see `catalog.signals`).
+"""
+
+import math
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from catalog.models import ProductOffer
+
+
+class SalePrices:
+    """Lowest sale prices of offers lasting today by ids of products"""
+    cache_key = 'sale-prices'
+    # prices of products are dropped by versions, stale ones expire
+    # at the boundary but not later than in this amount of seconds
+    max_timeout = 60 * 60 * 24
+
+    @property
+    def cache(self):
+        return caches[settings.API_CACHE_ALIAS]
+
+    @classmethod
+    def load_boundary(cls, today: date) -> date | None:
+        """
+        Return the next offer boundary
+        (None if no offers are lasting or upcoming)
+        """
+        boundaries = (
+            ProductOffer.objects
+            .upcoming(today)
+            .aggregate(
+                start=Min('dateFrom', filter=Q(dateFrom__gt=today)),
+                end=Min('dateTo', filter=Q(dateFrom__lte=today)),
+            )
+        )
+        if boundaries['end'] is not None:
+            boundaries['end'] += timedelta(days=1)
+        return min(
+            (day for day in boundaries.values() if day is not None),
+            default=None,
+        )
+
+    @classmethod
+    def load(cls, today: date, product_ids) -> dict[int, Decimal]:
+        """Return sale prices of given products having offers lasting today"""
+        return dict(
+            ProductOffer.objects
+            .upcoming(today)
+            .filter(dateFrom__lte=today, product__in=product_ids)
+            .order_by()
+            .values('product')
+            .annotate(price=Min('salePrice'))
+            .values_list('product', 'price')
+        )
+
+    @classmethod
+    def get_timeout(cls, boundary: date | None) -> int | None:
+        """Return seconds left until the start of the boundary day"""
+        if boundary is None:
+            return None
+        starts_at = timezone.make_aware(datetime.combine(boundary, time.min))
+        return max(1, math.ceil((starts_at - timezone.now()).total_seconds()))
+
+    def get(self) -> tuple[date | None, str]:
+        """
+        Return cached or loaded next offer boundary
+        and version of prices of the current period
+        """
+        today = timezone.localdate()
+        entry = self.cache.get(self.cache_key)
+        if entry is None or entry[0] is not None and entry[0] <= today:
+            entry = self.load_boundary(today), uuid.uuid4().hex
+            self.cache.set(self.cache_key, entry, self.get_timeout(entry[0]))
+        return entry
+
+    def make_key(self, version: str, product_id: int) -> str:
+        """Return key of sale price of the product in the period version"""
+        return f'{self.cache_key}:{version}:{product_id}'
+
+    def resolve(self, product_ids) -> dict[int, Decimal]:
+        """
+        Return sale prices of given products having offers lasting today,
+        products without offers are cached too (as None)
+        """
+        boundary, version = self.get()
+        keys = {self.make_key(version, pk): pk for pk in product_ids}
+        prices = self.cache.get_many(keys)
+        missing = {key: pk for key, pk in keys.items() if key not in prices}
+        if missing:
+            loaded = self.load(timezone.localdate(), missing.values())
+            prices.update(
+                (key, loaded.get(pk)) for key, pk in missing.items()
+            )
+            timeout = self.get_timeout(boundary)
+            self.cache.set_many(
+                {key: prices[key] for key in missing},
+                min(timeout or self.max_timeout, self.max_timeout),
+            )
+        return {
+            keys[key]: price
+            for key, price in prices.items()
+            if price is not None
+        }
+
+    def get_period(self) -> str:
+        """
+        Return token of the current offer period (the next offer boundary),
+        it changes when any offer starts or ends
+        """
+        boundary = self.get()[0]
+        return 'endless' if boundary is None else boundary.isoformat()
+
+    def clear(self) -> None:
+        """Drop the current period, prices will be loaded on next use"""
+        self.cache.delete(self.cache_key)
+
+
+sale_prices = SalePrices()
@@ -0,0 +1,166 @@
+"""
+This module contains full-text search of products.
+
+Every product has a search document (`catalog.models.ProductSearchDocument`)
+with normalized text of its title, tags, description and specifications,
+documents are kept up to date by `catalog.signals`
+and could be rebuilt with `manage.py rebuildsearch`.
+
+Search backend is chosen by database vendor:
+    `PostgresSearchBackend`: ranked search over GIN-indexed tsvector;
+    `SimpleSearchBackend`: portable ranked substring search
+        (used with SQLite, e.g. in tests)
+"""
+
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast
+
+from catalog.models import Product, ProductSearchDocument
+
+
+def normalize(text: str) -> str:
+    """Return lowercased text with collapsed whitespaces"""
+    return ' '.join(text.lower().split())
+
+
+def split_terms(text: str) -> list[str]:
+    """Return list of unique lowercased words of the text"""
+    return list(dict.fromkeys(re.findall(r'\w+', text.lower())))
+
+
+def build_document(product: Product) -> ProductSearchDocument:
+    """
+    Return unsaved search document of the product,
+    tags and specifications of the product should be prefetched
+    """
+    return ProductSearchDocument(
+        product=product,
+        title=normalize(product.title),
+        tags=normalize(' '.join(tag.name for tag in product.tags.all())),
+        body=normalize(
+            ' '.join(
+                [
+                    product.fullDescription,
+                    *(spec.value for spec in product.specifications.all()),
+                ]
+            )
+        ),
+    )
+
+
+def update_search_documents(product_ids, batch_size: int = 500) -> int:
+    """
+    Create or update search documents of products with given ids,
+    return amount of updated documents
+    """
+    products = (
+        Product.objects
+        .filter(pk__in=product_ids)
+        .prefetch_related('tags', 'specifications')
+    )
+    documents = ProductSearchDocument.objects.bulk_create(
+        [build_document(product) for product in products],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['title', 'tags', 'body'],
+    )
+    updated_ids = [document.product_id for document in documents]
+    get_search_backend(ProductSearchDocument.objects.db).update_vectors(
+        ProductSearchDocument.objects.filter(pk__in=updated_ids)
+    )
+    return len(documents)
+
+
+def search_products(queryset: QuerySet[Product], text: str) -> QuerySet:
+    """
+    Return products of the queryset matching all words of the text,
+    products are annotated with search rank as `_rank`
+    """
+    if not split_terms(text):
+        return queryset.annotate(_rank=Value(0.0))
+    return get_search_backend(queryset.db).search(queryset, text)
+
+
+class SimpleSearchBackend:
+    """
+    Portable search over normalized text of search documents.
+    Every word must be found in title, tags or body of the document,
+    rank is a weighted sum of found words
+    """
+    weights = (('title', 1.0), ('tags', 0.4), ('body', 0.2))
+
+    @classmethod
+    def update_vectors(cls, documents: QuerySet) -> None:
+        """There are no vectors to update"""
+
+    @classmethod
+    def search(cls, queryset: QuerySet[Product], text: str) -> QuerySet:
+        rank = Value(0.0)
+        for term in split_terms(text):
+            term_filter = Q()
+            for field, weight in cls.weights:
+                lookup = f'search_document__{field}__contains'
+                term_filter |= Q(**{lookup: term})
+                rank += Case(
+                    When(Q(**{lookup: term}), then=Value(weight)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            queryset = queryset.filter(term_filter)
+
+        return queryset.annotate(_rank=rank)
+
+
+class PostgresSearchBackend:
+    """
+    Search over tsvector of search documents (GIN index is created
+    by migration) with text search configuration
+    `settings.CATALOG_SEARCH_CONFIG`. Every word is matched as a prefix,
+    so partially typed words are found too
+    """
+
+    @classmethod
+    def get_vector(cls) -> SearchVector:
+        config = settings.CATALOG_SEARCH_CONFIG
+        return (
+            SearchVector('title', weight='A', config=config)
+            + SearchVector('tags', weight='B', config=config)
+            + SearchVector('body', weight='C', config=config)
+        )
+
+    @classmethod
+    def update_vectors(cls, documents: QuerySet) -> None:
+        documents.update(vector=cls.get_vector())
+
+    @classmethod
+    def search(cls, queryset: QuerySet[Product], text: str) -> QuerySet:
+        query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in split_terms(text)),
+            search_type='raw',
+            config=settings.CATALOG_SEARCH_CONFIG,
+        )
+        return (
+            queryset
+            .filter(search_document__vector=query)
+            # rank is `real`, it is cast to `double precision`, so values
+            # passed back in cursors of pages are equal to stored ones
+            .annotate(
+                _rank=Cast(
+                    SearchRank(F('search_document__vector'), query),
+                    FloatField(),
+                )
+            )
+        )
+
+
+def get_search_backend(using: str):
+    """Return search backend class for given database alias"""
+    if connections[using].vendor == 'postgresql':
+        return PostgresSearchBackend
+    return SimpleSearchBackend
@@ -0,0 +1,257 @@
+"""
+This module contains signal receivers which keep up to date
+review stats of products (`rating_sum`, `reviews_count`, `rating_avg`),
+search documents of products (see `catalog.search`),
+suggestions index (see `catalog.suggest`),
+cached sale prices (see `catalog.prices`),
+closure table of category tree (`CategoryClosure`)
+and amounts of active products of categories (`products_count`)
+"""
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from catalog.models import (
+    Category,
+    CategoryClosure,
+    Product,
+    ProductOffer,
+    Review,
+    Specification,
+    Tag,
+)
+from catalog.prices import sale_prices
+from catalog.search import update_search_documents
+from catalog.suggest import suggestions
+from common_mixins.signals import active_status_changed
+
+
+@receiver(pre_save, sender=Review)
+def remember_stored_review(sender, instance: Review, raw=False, **kwargs):
+    """Remember product and rate of the review as they are in database"""
+    instance._stored = None
+    if raw or instance.pk is None:
+        return
+
+    instance._stored = (
+        Review.objects
+        .select_for_update()
+        .filter(pk=instance.pk)
+        .values_list('product_id', 'rate')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_save(sender, instance: Review, raw=False, **kwargs):
+    """Apply created or edited review to review stats of the product"""
+    if raw:
+        return
+
+    stored = getattr(instance, '_stored', None)
+    products = Product.objects.filter(pk=instance.product_id)
+
+    if stored is None:
+        products.update_review_stats(instance.rate, 1)
+        return
+
+    stored_product_id, stored_rate = stored
+    if stored_product_id == instance.product_id:
+        if stored_rate != instance.rate:
+            products.update_review_stats(instance.rate - stored_rate, 0)
+        return
+
+    # review was moved to another product
+    Product.objects.filter(pk=stored_product_id).update_review_stats(
+        -stored_rate, -1
+    )
+    products.update_review_stats(instance.rate, 1)
+
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_delete(sender, instance: Review, **kwargs):
+    """Remove deleted review from review stats of the product"""
+    Product.objects.filter(pk=instance.product_id).update_review_stats(
+        -instance.rate, -1
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_search_on_product_save(sender, instance: Product, raw=False,
+                                  **kwargs):
+    """Rebuild search document of saved product"""
+    if not raw:
+        update_search_documents([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Specification)
+def update_search_on_keyword_save(sender, instance, raw=False, created=False,
+                                  **kwargs):
+    """Rebuild search documents of products of edited tag or specification"""
+    if raw or created:
+        return
+    update_search_documents(
+        instance.products.values_list('pk', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def update_on_keywords_change(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """
+    Rebuild search documents of products whose tags
+    or specifications were changed
+    """
+    if action == 'pre_clear' and reverse:
+        # products are unknown after the relations are cleared
+        instance._cleared_product_ids = list(
+            instance.products.values_list('pk', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'post_clear':
+        product_ids = getattr(instance, '_cleared_product_ids', [])
+    else:
+        product_ids = pk_set
+    update_search_documents(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def update_suggestions_on_product_save(sender, instance: Product, raw=False,
+                                       **kwargs):
+    """Add, replace or remove saved product in suggestions"""
+    if not raw:
+        suggestions.update_product(instance)
+
+
+@receiver(post_save, sender=Tag)
+def update_suggestions_on_tag_save(sender, instance: Tag, raw=False,
+                                   **kwargs):
+    """Add, replace or remove saved tag in suggestions"""
+    if not raw:
+        suggestions.update_tag(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Tag)
+def update_suggestions_on_delete(sender, instance, **kwargs):
+    """Remove deleted product or tag from suggestions"""
+    suggestions.remove(instance)
+
+
+@receiver(active_status_changed, sender=Product)
+@receiver(active_status_changed, sender=Tag)
+def update_suggestions_on_status_change(sender, pks, **kwargs):
+    """Add activated and remove deactivated products or tags"""
+    suggestions.refresh(sender, pks)
+
+
+@receiver(post_save, sender=Category)
+def update_tree_on_category_save(sender, instance: Category, raw=False,
+                                 created=False, **kwargs):
+    """Add created category to closure table"""
+    if created and not raw:
+        CategoryClosure.objects.create(ancestor=instance, descendant=instance)
+
+
+@receiver(post_delete, sender=Category)
+def update_tree_on_category_delete(sender, **kwargs):
+    """Remove paths through deleted category"""
+    CategoryClosure.objects.rebuild()
+    Category.objects.update_products_count()
+
+
+@receiver(m2m_changed, sender=Category.subcategories.through)
+def update_tree_on_subcategories_change(sender, action, **kwargs):
+    """Rebuild closure table on changing subcategories"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        CategoryClosure.objects.rebuild()
+        Category.objects.update_products_count()
+
+
+@receiver(pre_save, sender=Product)
+def remember_stored_product(sender, instance: Product, raw=False,
+                            update_fields=None, **kwargs):
+    """Remember category and status of the product as they are in database"""
+    instance._stored = None
+    if (
+        raw
+        or instance.pk is None
+        or update_fields is not None
+        and not {'category', 'is_active'} & set(update_fields)
+    ):
+        return
+
+    instance._stored = (
+        Product.objects
+        .filter(pk=instance.pk)
+        .values_list('category_id', 'is_active')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_products_count_on_product_save(sender, instance: Product,
+                                          raw=False, update_fields=None,
+                                          **kwargs):
+    """
+    Recalculate amounts of products of the old and the new category
+    of the product and their ancestors if the product was moved,
+    (de)activated or created active
+    """
+    if raw or update_fields is not None and not (
+        {'category', 'is_active'} & set(update_fields)
+    ):
+        return
+
+    stored = getattr(instance, '_stored', None)
+    if stored is None:
+        stored = (instance.category_id, False)
+    if stored == (instance.category_id, instance.is_active):
+        return
+    if not (stored[1] or instance.is_active):
+        return
+    Category.objects.ancestors_of(
+        {stored[0], instance.category_id}
+    ).update_products_count()
+
+
+@receiver(post_delete, sender=Product)
+def update_products_count_on_product_delete(sender, instance: Product,
+                                            **kwargs):
+    """Recalculate amounts of products of category of deleted product"""
+    if instance.is_active:
+        Category.objects.ancestors_of(
+            [instance.category_id]
+        ).update_products_count()
+
+
+@receiver(active_status_changed, sender=Product)
+def update_products_count_on_status_change(sender, pks, **kwargs):
+    """Recalculate amounts of products of categories of (de)activated ones"""
+    Category.objects.ancestors_of(
+        Product.objects.filter(pk__in=pks).values('category')
+    ).update_products_count()
+
+
+@receiver(post_save, sender=ProductOffer)
+@receiver(post_delete, sender=ProductOffer)
+@receiver(active_status_changed, sender=ProductOffer)
+def drop_sale_prices_on_offer_change(sender, **kwargs):
+    """
+    Changed offer may change prices and the next offer boundary,
+    prices are dropped when the transaction is committed, so they
+    aren't loaded again before the change is visible
+    """
+    transaction.on_commit(sale_prices.clear)
@@ -0,0 +1,195 @@
+"""
+This module contains in-memory prefix index of active products and tags
+used for search-as-you-type suggestions (api/products/suggest/).
+
+Index is built from database on first use in each process
+and then is updated incrementally by `catalog.signals`
+on saving, deleting and (de)activating products and tags.
+As other processes can't notify the index about their changes,
+it is fully rebuilt every `settings.SUGGEST_INDEX_TTL` seconds.
+"""
+
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.shortcuts import reverse
+
+from catalog.models import Product, Tag
+from catalog.search import normalize
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized keys searched with bisect.
+    Every item is indexed by its text starting from each word,
+    so prefix of any word of the text finds the item
+    """
+
+    def __init__(self):
+        self._keys: list[tuple[str, int]] = []
+        self._items: dict[int, tuple[dict, list[str]]] = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    @classmethod
+    def get_keys(cls, text: str) -> list[str]:
+        words = normalize(text).split()
+        return [' '.join(words[start:]) for start in range(len(words))]
+
+    def load(self, items) -> None:
+        """Replace content of the index with given (id, text, value) items"""
+        self._items = {}
+        keys = []
+        for item_id, text, value in items:
+            item_keys = self.get_keys(text)
+            self._items[item_id] = (value, item_keys)
+            keys.extend((key, item_id) for key in item_keys)
+        keys.sort()
+        self._keys = keys
+
+    def add(self, item_id: int, text: str, value: dict) -> None:
+        """Add item to the index or replace existing one"""
+        self.remove(item_id)
+        item_keys = self.get_keys(text)
+        self._items[item_id] = (value, item_keys)
+        for key in item_keys:
+            bisect.insort(self._keys, (key, item_id))
+
+    def remove(self, item_id: int) -> None:
+        """Remove item from the index if it exists"""
+        if item_id not in self._items:
+            return
+        _, item_keys = self._items.pop(item_id)
+        for key in item_keys:
+            position = bisect.bisect_left(self._keys, (key, item_id))
+            if self._keys[position:position + 1] == [(key, item_id)]:
+                del self._keys[position]
+
+    def search(self, prefix: str, limit: int) -> list[dict]:
+        """Return values of up to `limit` items having word with prefix"""
+        prefix = normalize(prefix)
+        found = {}
+        position = bisect.bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(found) < limit:
+            key, item_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(item_id, self._items[item_id][0])
+            position += 1
+        return list(found.values())
+
+
+class ProductSuggestions:
+    """Prefix indexes of active products and tags"""
+
+    def __init__(self):
+        self.products = PrefixIndex()
+        self.tags = PrefixIndex()
+        self.built_at = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_built(self) -> bool:
+        return self.built_at is not None
+
+    def clear(self) -> None:
+        """Drop content of indexes, they will be rebuilt on next use"""
+        with self._lock:
+            self.products.load([])
+            self.tags.load([])
+            self.built_at = None
+
+    def build(self) -> None:
+        """Load active products and tags from database"""
+        products = list(
+            Product.objects
+            .filter(is_active=True)
+            .values_list('pk', 'title')
+        )
+        tags = list(
+            Tag.objects.filter(is_active=True).values_list('pk', 'name')
+        )
+        with self._lock:
+            self.products.load(
+                (pk, title, self.product_value(pk, title))
+                for pk, title in products
+            )
+            self.tags.load(
+                (pk, name, self.tag_value(pk, name)) for pk, name in tags
+            )
+            self.built_at = time.monotonic()
+
+    def ensure_built(self) -> None:
+        with self._lock:
+            expired = (
+                self.is_built
+                and time.monotonic() - self.built_at
+                > settings.SUGGEST_INDEX_TTL
+            )
+            if not self.is_built or expired:
+                self.build()
+
+    @classmethod
+    def product_value(cls, pk: int, title: str) -> dict:
+        return {
+            'id': pk,
+            'title': title,
+            'href': reverse('frontend:product', kwargs={'pk': pk}),
+        }
+
+    @classmethod
+    def tag_value(cls, pk: int, name: str) -> dict:
+        return {'id': pk, 'name': name}
+
+    def update_product(self, product: Product) -> None:
+        """Add, replace or remove product depending on its active status"""
+        with self._lock:
+            if not self.is_built:
+                return
+            if product.is_active:
+                self.products.add(
+                    product.pk,
+                    product.title,
+                    self.product_value(product.pk, product.title),
+                )
+            else:
+                self.products.remove(product.pk)
+
+    def update_tag(self, tag: Tag) -> None:
+        """Add, replace or remove tag depending on its active status"""
+        with self._lock:
+            if not self.is_built:
+                return
+            if tag.is_active:
+                self.tags.add(tag.pk, tag.name, self.tag_value(tag.pk, tag.name))
+            else:
+                self.tags.remove(tag.pk)
+
+    def remove(self, instance: Product | Tag) -> None:
+        """Remove deleted product or tag"""
+        index = self.products if isinstance(instance, Product) else self.tags
+        with self._lock:
+            index.remove(instance.pk)
+
+    def refresh(self, model, pks) -> None:
+        """Reload products or tags with given primary keys from database"""
+        if not self.is_built:
+            return
+        update = self.update_product if model is Product else self.update_tag
+        for instance in model.objects.filter(pk__in=pks):
+            update(instance)
+
+    def suggest(self, text: str, limit: int = 10) -> dict:
+        """Return products and tags having word starting with the text"""
+        self.ensure_built()
+        with self._lock:
+            return {
+                'products': self.products.search(text, limit),
+                'tags': self.tags.search(text, limit),
+            }
+
+
+suggestions = ProductSuggestions()
@@ -6,6 +6,8 @@ from django.http import HttpRequest
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import ngettext
 
+from common_mixins.signals import active_status_changed
+
 
 class SoftDeleteMixin:
     """Mixin for adding soft-delete actions to admin models"""
@@ -32,12 +34,17 @@ class SoftDeleteMixin:
     ) -> None:
         """
         Handle action to set active-status for queryset,
-        Send message to user with updated amount and action taken
+        Send `active_status_changed` signal with updated objects
+        and message to user with updated amount and action taken
         """
+        pks = list(queryset.values_list('pk', flat=True))
         updated = (
             queryset.update(is_active=False) if action == 'inactive'
             else queryset.update(is_active=True)
         )
+        active_status_changed.send(
+            sender=queryset.model, pks=pks, is_active=action == 'active'
+        )
         self.message_user(
             request,
             message=ngettext(
@@ -0,0 +1,15 @@
+from django.dispatch import Signal
+
+# Sent by `common_mixins.admin_mixins.SoftDeleteMixin` after bulk update
+# of active status, as `QuerySet.update()` doesn't send model signals.
+# Arguments: `sender` - model class, `pks` - list of primary keys of updated
+# objects, `is_active` - new active status
+active_status_changed = Signal()
+
+# Sent by `purchase.models.StockReservationQuerySet.release_expired`
+# and `api.purchase_api.service.reserve_stock` when available stock
+# of products is changed by reservations (only in bulk or when products
+# become unavailable, so caches of listings are not reset on every order).
+# Arguments: `sender` - `purchase.models.StockReservation`,
+# `product_ids` - list of primary keys of products
+reserved_stock_changed = Signal()
@@ -2,7 +2,13 @@ from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
 from common_mixins.admin_mixins import SoftDeleteMixin
-from purchase.models import DeliveryType, Order, OrderItem  # OrderStatus, PaymentType
+from purchase.models import (  # OrderStatus, PaymentType
+    CartItem,
+    DeliveryType,
+    Order,
+    OrderItem,
+    StockReservation,
+)
 
 
 class OrderItemInline(admin.StackedInline):
@@ -23,12 +29,25 @@ class OrderAdmin(SoftDeleteMixin, admin.ModelAdmin):
         'paymentType',
         'status',
         'city',
-        'totalCost',
+        'total_cost',
     )
     list_display_links = list_display
+    readonly_fields = ('items_cost', 'delivery_cost', 'total_cost')
     inlines = [OrderItemInline]
 
 
 @admin.register(DeliveryType)
 class DeliveryTypeAdmin(SoftDeleteMixin, admin.ModelAdmin):
     pass
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'expires_at')
+    list_select_related = ('order__buyer__user', 'product')
+
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'product', 'count')
+    list_select_related = ('user', 'product')
@@ -6,3 +6,12 @@ class PurchaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'purchase'
     verbose_name = _('purchase')
+
+    def ready(self):
+        from django.conf import settings
+
+        from purchase import signals  # noqa: F401
+        from purchase.sweeper import start_sweeper
+
+        if settings.STOCK_RESERVATION_SWEEP_INTERVAL:
+            start_sweeper(settings.STOCK_RESERVATION_SWEEP_INTERVAL)
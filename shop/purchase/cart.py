@@ -1,6 +1,12 @@
 """
-This module contains session-based class Cart
-Slightly modified Antonio Melé's cart
+This module contains carts of users:
+    `Cart`: session-based cart of anonymous user
+        (slightly modified Antonio Melé's cart);
+    `DatabaseCart`: cart of authenticated user stored
+        in `purchase.models.CartItem`, so it is kept across devices.
+Session cart is merged into database cart on login (see `purchase.signals`).
+Carts store only amounts of products, prices are always current
+(see `catalog.prices`)
 """
 
 
@@ -8,48 +14,78 @@ import json
 from decimal import Decimal
 
 from django.conf import settings
+from django.db import IntegrityError, models, transaction
 
 from catalog.models import Product
+from catalog.prices import sale_prices
+from purchase.models import CartItem
 
 
 class Cart:
     def __init__(self, request):
-        """Initialize the cart."""
+        """
+        Initialize the cart, it is stored in the session
+        only after the first change
+        """
         self.session = request.session
-        products = self.session.get(settings.CART_SESSION_ID)
-        if not products:
-            # save an empty cart in the session
-            products = self.session[settings.CART_SESSION_ID] = {}
-        self.products = products
+        self.products = self.session.get(settings.CART_SESSION_ID, {})
 
     def __iter__(self):
         """
-        Iterate over the items in the cart and get the products
-        from the database.
+        Iterate over the products in the cart with their amount as `count`
+        and current price as `price`, products are taken with single query
+        (and prefetching queries of `ProductQuerySet.with_listing_data`)
         """
-        product_ids = self.products.keys()
-        # get the product objects and add them to the cart
-        qs_values = Product.objects.filter(id__in=product_ids).values()
-
-        cart = self.products
-
-        for product in qs_values:
-            product_id = str(product['id'])
-            product['count'] = cart.get(product_id)['count']
-            product['price'] = cart.get(product_id)['price']
-            yield Product(**product)
+        products = list(self.get_products())
+        prices = sale_prices.resolve(product.pk for product in products)
+        for product in products:
+            product.count = product._count
+            product.price = prices.get(product.pk, product.price)
+            yield product
 
     def __repr__(self):
         return json.dumps(self.products)
 
+    def get_counts(self) -> dict[int, int]:
+        """Return amount of each product in the cart"""
+        return {
+            int(product_id): item['count']
+            for product_id, item in self.products.items()
+        }
+
+    def get_products(self) -> models.QuerySet[Product]:
+        """
+        Return queryset of products in the cart prepared for serialization
+        (see `get_queryset`)
+        """
+        return self.get_queryset().with_listing_data()
+
+    def get_queryset(self) -> models.QuerySet[Product]:
+        """
+        Return queryset of products in the cart
+        annotated with amount as `_count`
+        """
+        counts = self.get_counts()
+        return (
+            Product.objects
+            .filter(pk__in=counts)
+            .annotate(
+                _count=models.Case(
+                    *(
+                        models.When(pk=pk, then=models.Value(count))
+                        for pk, count in counts.items()
+                    ),
+                    default=0,
+                    output_field=models.IntegerField(),
+                )
+            )
+        )
+
     def add(self, product, quantity=1):
         """Add a product to the cart or update its quantity."""
         product_id = str(product.id)
         if product_id not in self.products:
-            self.products[product_id] = {
-                'count': quantity,
-                'price': str(product.price),
-            }
+            self.products[product_id] = {'count': int(quantity)}
         else:
             self.products[product_id]['count'] += int(quantity)
 
@@ -62,7 +98,10 @@ class Cart:
         if product_id not in self.products:
             return
 
-        if not quantity or self.products[product_id]['count'] <= 1:
+        if (
+            not quantity
+            or self.products[product_id]['count'] <= int(quantity)
+        ):
             self.remove(product)
         else:
             self.products[product_id]['count'] -= int(quantity)
@@ -70,8 +109,8 @@ class Cart:
         self.save()
 
     def save(self):
-        """Mark the session as "modified" to make sure it gets saved"""
-        self.session.modified = True
+        """Store the cart in the session, it marks the session as modified"""
+        self.session[settings.CART_SESSION_ID] = self.products
 
     def remove(self, product):
         """Remove a product from the cart."""
@@ -82,15 +121,101 @@ class Cart:
 
     def clear(self):
         """Remove cart from session"""
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        # the session is marked as "modified" only if it had the cart
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.products = {}
 
-    def get_total_cost(self):
+    def get_summary(self) -> dict:
+        """
+        Return amount of products, amount of items and total cost
+        of the cart, taken with single query without loading products
+        """
+        products, count, total_cost = 0, 0, Decimal(0)
+        rows = list(self.get_queryset().values_list('pk', 'price', '_count'))
+        prices = sale_prices.resolve(pk for pk, _, _ in rows)
+        for pk, price, product_count in rows:
+            price = prices.get(pk, price)
+            products += 1
+            count += product_count
+            total_cost += price * product_count
+        return {'products': products, 'count': count, 'totalCost': total_cost}
+
+    def get_total_cost(self) -> Decimal:
         """Return total cost of the cart"""
-        return sum(
-            Decimal(item['price']) * item['quantity']
-            for item in self.products.values()
+        return self.get_summary()['totalCost']
+
+
+class DatabaseCart(Cart):
+    """Cart of authenticated user stored in database"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def items(self) -> models.QuerySet[CartItem]:
+        return CartItem.objects.filter(user=self.user)
+
+    @property
+    def products(self) -> dict[str, dict]:
+        return {
+            str(product_id): {'count': count}
+            for product_id, count in self.items.values_list('product', 'count')
+        }
+
+    def get_counts(self) -> dict[int, int]:
+        return dict(self.items.values_list('product', 'count'))
+
+    def get_queryset(self) -> models.QuerySet[Product]:
+        return (
+            Product.objects
+            .filter(cart_items__user=self.user)
+            .annotate(_count=models.F('cart_items__count'))
         )
 
-    def all(self):
-        return [product for product in self.products.values()]
+    def add(self, product, quantity=1):
+        self.merge({product.id: int(quantity)})
+
+    def merge(self, counts: dict[int, int]) -> None:
+        """Add amounts of products to the cart"""
+        for product_id, count in counts.items():
+            updated = self.items.filter(product_id=product_id).update(
+                count=models.F('count') + count
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(
+                        user=self.user, product_id=product_id, count=count
+                    )
+            except IntegrityError:
+                # the item was created by concurrent request
+                self.items.filter(product_id=product_id).update(
+                    count=models.F('count') + count
+                )
+
+    def reduce(self, product, quantity):
+        items = self.items.filter(product=product)
+        if not quantity:
+            items.delete()
+            return
+        # items which would have no products left are removed first,
+        # so count never reaches zero or negative values
+        items.filter(count__lte=int(quantity)).delete()
+        items.update(count=models.F('count') - int(quantity))
+
+    def save(self):
+        """Changes are saved at once"""
+
+    def remove(self, product):
+        self.items.filter(product=product).delete()
+
+    def clear(self):
+        self.items.delete()
+
+
+def get_cart(request) -> Cart:
+    """Return database cart of authenticated user or session cart"""
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    return Cart(request)
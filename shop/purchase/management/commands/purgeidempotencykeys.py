@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from purchase.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired and abandoned idempotency keys of payments'
+
+    def handle(self, *args, **options):
+        purged = IdempotencyKey.objects.purge()
+        self.stdout.write(
+            self.style.SUCCESS(f'Purged {purged} idempotency keys')
+        )
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from purchase.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Release expired stock reservations of unpaid orders'
+
+    def handle(self, *args, **options):
+        released = StockReservation.objects.release_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f'Released {released} stock reservations')
+        )
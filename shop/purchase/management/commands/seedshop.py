@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+
+from purchase.seeding import ShopSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic categories, tags, specifications, products '
+        '(with images, reviews and offers), users and orders '
+        'for load testing, the same seed gives the same data'
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('categories', 50, 'amount of categories'),
+            ('tags', 200, 'amount of tags'),
+            ('specifications', 500, 'amount of specifications'),
+            ('products', 10000, 'amount of products'),
+            ('users', 1000, 'amount of users with profiles'),
+            ('orders', 10000, 'amount of orders'),
+            ('images', 2, 'max amount of images of a product'),
+            ('reviews', 3, 'max amount of reviews of a product'),
+            ('items', 10, 'max amount of items of an order'),
+            ('seed', 0, 'seed of random generators'),
+            ('batch-size', 5000, 'amount of rows created at once'),
+            ('workers', 1, 'amount of processes creating batches'),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            '--offers',
+            type=float,
+            default=0.1,
+            help='share of products with offers',
+        )
+
+    def handle(self, *args, **options):
+        if options['products'] and not options['categories']:
+            raise CommandError('Products need at least one category')
+        if options['orders'] and not (
+            options['products'] and options['users']
+        ):
+            raise CommandError('Orders need at least one product and user')
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size should be positive')
+
+        workers = options.pop('workers')
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write(
+                self.style.WARNING('SQLite has a single writer, workers = 1')
+            )
+            workers = 1
+
+        call_command('makepurchasetypes', stdout=self.stdout)
+        started = time.monotonic()
+        ShopSeeder(**{
+            name: options[name]
+            for name in (
+                'seed', 'categories', 'tags', 'specifications', 'products',
+                'users', 'orders', 'images', 'reviews', 'items', 'offers',
+                'batch_size',
+            )
+        }).run(workers)
+        # cached responses, counts and prices are outdated
+        caches[settings.API_CACHE_ALIAS].clear()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                '{products} products and {orders} orders generated '
+                'in {seconds:.1f}s'.format(
+                    seconds=time.monotonic() - started, **options
+                )
+            )
+        )
@@ -1,13 +1,19 @@
 from django.http import HttpRequest, HttpResponse
+from django.utils.functional import SimpleLazyObject
 
-from purchase.cart import Cart
+from purchase.cart import get_cart
 
 
 class SetCartMiddleware:
+    """
+    Set cart of user (see `purchase.cart.get_cart`) as `request.cart`,
+    the cart is created on first access, so requests which don't use it
+    (static files, catalog, etc.) don't load user and session
+    """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
-        request.cart = Cart(request)
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
         response = self.get_response(request)
         return response
@@ -0,0 +1,77 @@
+# Generated by Django 4.2 on 2026-10-18 08:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_order_costs(apps, schema_editor):
+    Order = apps.get_model('purchase', 'Order')
+    OrderItem = apps.get_model('purchase', 'OrderItem')
+    DeliveryType = apps.get_model('purchase', 'DeliveryType')
+    Order.objects.update(
+        items_cost=Coalesce(
+            models.Subquery(
+                OrderItem.objects
+                .filter(order=models.OuterRef('pk'))
+                .order_by()
+                .values('order')
+                .annotate(
+                    cost=models.Sum(
+                        models.F('price') * models.F('quantity'),
+                        output_field=models.DecimalField(),
+                    )
+                )
+                .values('cost')
+            ),
+            Decimal(0),
+            output_field=models.DecimalField(),
+        )
+    )
+    delivery_types = DeliveryType.objects.filter(
+        pk=models.OuterRef('deliveryType_id')
+    )
+    Order.objects.update(
+        delivery_cost=models.Case(
+            models.When(
+                models.Exists(delivery_types.filter(type='regular'))
+                & models.Q(items_cost__gte=2000),
+                then=Decimal(0),
+            ),
+            default=Coalesce(
+                models.Subquery(delivery_types.values('cost')[:1]),
+                Decimal(0),
+            ),
+            output_field=models.DecimalField(),
+        )
+    )
+    Order.objects.update(
+        total_cost=models.F('items_cost') + models.F('delivery_cost')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0002_alter_deliverytype_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='cost of delivery'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='cost of products'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='total cost'),
+        ),
+        migrations.RunPython(fill_order_costs, migrations.RunPython.noop),
+    ]
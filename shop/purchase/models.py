@@ -1,11 +1,16 @@
+from datetime import timedelta
 from decimal import Decimal
 
-from django.contrib import admin
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from accounts.models import Profile
 from catalog.models import Product
+from common_mixins.signals import reserved_stock_changed
 from purchase.choices import PaymentTypeChoices, StatusChoices, DeliveryChoices
 
 
@@ -77,6 +82,71 @@ class DeliveryType(models.Model):
         return self.type
 
 
+class OrderQuerySet(models.QuerySet):
+    def update_costs(self) -> int:
+        """
+        Recalculate stored costs of orders with single UPDATE:
+        cost of purchases, cost of delivery (regular delivery is free
+        for orders costing `Order.FREE_DELIVERY_MIN_COST` and more)
+        and total cost
+        """
+        items_cost = Coalesce(
+            models.Subquery(
+                OrderItem.objects
+                .filter(order=models.OuterRef('pk'))
+                .values('order')
+                .annotate(
+                    cost=models.Sum(
+                        models.F('price') * models.F('quantity'),
+                        output_field=models.DecimalField(),
+                    )
+                )
+                .values('cost')
+            ),
+            Decimal(0),
+            output_field=models.DecimalField(),
+        )
+        delivery_types = DeliveryType.objects.filter(
+            pk=models.OuterRef('deliveryType_id')
+        )
+        is_free = (
+            models.Exists(delivery_types.filter(type='regular'))
+            & GreaterThanOrEqual(items_cost, Order.FREE_DELIVERY_MIN_COST)
+        )
+        delivery_cost = models.Case(
+            models.When(is_free, then=Decimal(0)),
+            default=Coalesce(
+                models.Subquery(delivery_types.values('cost')[:1]),
+                Decimal(0),
+            ),
+            output_field=models.DecimalField(),
+        )
+        return self.update(
+            items_cost=items_cost,
+            delivery_cost=delivery_cost,
+            total_cost=items_cost + delivery_cost,
+        )
+
+    def with_details(self) -> 'OrderQuerySet':
+        """
+        Select buyer and delivery type and prefetch purchases
+        with products and their images, ordered as products of the order
+        """
+        purchases = (
+            OrderItem.objects
+            .select_related('product')
+            .order_by('product__stock', 'pk')
+        )
+        return (
+            self
+            .select_related('buyer__user', 'deliveryType')
+            .prefetch_related(
+                models.Prefetch('purchases', queryset=purchases),
+                'purchases__product__images',
+            )
+        )
+
+
 class Order(models.Model):
     buyer = models.ForeignKey(
         Profile,
@@ -115,36 +185,271 @@ class Order(models.Model):
     city = models.CharField(max_length=100, default='', verbose_name=_('city'))
     address = models.TextField(default='', verbose_name=_('address'))
     is_active = models.BooleanField(default=True, verbose_name=_('active'))
+    items_cost = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        default=0,
+        editable=False,
+        verbose_name=_('cost of products'),
+    )
+    delivery_cost = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        default=0,
+        editable=False,
+        verbose_name=_('cost of delivery'),
+    )
+    total_cost = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        default=0,
+        editable=False,
+        verbose_name=_('total cost'),
+    )
+
+    FREE_DELIVERY_MIN_COST = 2000
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('order')
         verbose_name_plural = _('orders')
+        indexes = (
+            models.Index('buyer', 'status', name='order_buyer_status'),
+        )
 
-    def product_price(self, product: Product):
-        oi = OrderItem.objects.get(product=product, order=self)
-        return oi.price
-
-    def product_count(self, product: Product):
-        oi = OrderItem.objects.get(product=product, order=self)
-        return oi.quantity
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored delivery type to detect its change on save"""
+        instance = super().from_db(db, field_names, values)
+        instance._stored_delivery_type_id = instance.deliveryType_id
+        return instance
 
-    @admin.display(description=_('total cost'))
-    def totalCost(self):
-        order_products = OrderItem.objects.filter(order=self)
-        products_cost = sum([i.total_cost for i in order_products])
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or {'deliveryType', 'deliveryType_id'} & set(fields):
+            self._stored_delivery_type_id = self.deliveryType_id
 
-        if not self.deliveryType:
-            # needed on order creation
-            return products_cost
+    def save(self, *args, **kwargs):
+        """
+        Save the order and recalculate its costs if it is new
+        or its delivery type was changed, so that the captured
+        delivery cost is kept on other updates
+        """
+        update_fields = kwargs.get('update_fields')
+        recalculate = self._state.adding or (
+            self.deliveryType_id
+            != getattr(self, '_stored_delivery_type_id', None)
+            and (update_fields is None or 'deliveryType' in update_fields)
+        )
+        super().save(*args, **kwargs)
+        self._stored_delivery_type_id = self.deliveryType_id
+        if recalculate:
+            self.update_costs()
 
-        if self.deliveryType.type == 'regular':
-            delivery = self.deliveryType.cost if products_cost < 2000 else 0
-        else:
-            delivery = self.deliveryType.cost
+    def update_costs(self) -> None:
+        """Recalculate stored costs of the order and reload them"""
+        Order.objects.filter(pk=self.pk).update_costs()
+        self.refresh_from_db(
+            fields=['items_cost', 'delivery_cost', 'total_cost']
+        )
 
-        return delivery + products_cost
+    @property
+    def totalCost(self):
+        """Return alias for self.total_cost"""
+        return self.total_cost
 
     def __str__(self):
         return '{buyer} {Order} id{o_id}'.format(
             buyer=self.buyer.fullName, Order=_('Order'), o_id=self.id
         )
+
+
+class StockReservationQuerySet(models.QuerySet):
+    def live(self) -> 'StockReservationQuerySet':
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self) -> 'StockReservationQuerySet':
+        return self.filter(expires_at__lte=timezone.now())
+
+    def reserved_stock(self) -> dict[int, int]:
+        """Return total reserved quantity of each product"""
+        return dict(
+            self
+            .order_by()
+            .values('product')
+            .annotate(total=models.Sum('quantity'))
+            .values_list('product', 'total')
+        )
+
+    def release_expired(self) -> int:
+        """
+        Delete expired reservations with single DELETE,
+        return amount of deleted reservations
+        """
+        expired = self.expired()
+        product_ids = list(
+            expired.order_by().values_list('product_id', flat=True).distinct()
+        )
+        deleted, _ = expired.delete()
+        if deleted:
+            reserved_stock_changed.send(
+                sender=StockReservation, product_ids=product_ids
+            )
+        return deleted
+
+
+class StockReservation(models.Model):
+    """
+    Stock of the product held for the order awaiting payment
+    until `expires_at`, expired reservations are released
+    by `manage.py releasereservations` or by the sweeper thread
+    (see `purchase.sweeper`)
+    """
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        verbose_name=_('order'),
+        related_name='reservations',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        verbose_name=_('product'),
+        related_name='reservations',
+    )
+    quantity = models.PositiveIntegerField(verbose_name=_('quantity'))
+    expires_at = models.DateTimeField(verbose_name=_('expiration time'))
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('stock reservation')
+        verbose_name_plural = _('stock reservations')
+        indexes = (
+            models.Index(
+                'product', 'expires_at', name='reservation_product_expires'
+            ),
+            models.Index('expires_at', name='reservation_expires'),
+        )
+
+    def __str__(self):
+        return '{Order} id{o_id} - {Product} id{p_id} x{quantity}'.format(
+            Order=_('Order'),
+            o_id=self.order_id,
+            Product=_('Product'),
+            p_id=self.product_id,
+            quantity=self.quantity,
+        )
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def abandoned(self) -> 'IdempotencyKeyQuerySet':
+        """
+        Filter keys of requests which are still in progress after
+        `settings.IDEMPOTENCY_KEY_TIMEOUT` seconds, their workers are
+        supposed to be dead, so the key could be claimed again
+        """
+        return self.filter(
+            status_code__isnull=True,
+            created_at__lte=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TIMEOUT
+            ),
+        )
+
+    def expired(self) -> 'IdempotencyKeyQuerySet':
+        """
+        Filter keys of completed requests stored longer than
+        `settings.IDEMPOTENCY_KEY_TTL` seconds
+        """
+        return self.filter(
+            status_code__isnull=False,
+            created_at__lte=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TTL
+            ),
+        )
+
+    def purge(self) -> int:
+        """
+        Delete expired and abandoned keys with single DELETE each,
+        return amount of deleted keys
+        """
+        expired, _ = self.expired().delete()
+        abandoned, _ = self.abandoned().delete()
+        return expired + abandoned
+
+
+class IdempotencyKey(models.Model):
+    """
+    Key of request sent by user with `Idempotency-Key` header
+    and the response to the first request with the key,
+    `status_code` is empty while the request is being processed,
+    keys are purged by `manage.py purgeidempotencykeys`
+    or by the sweeper thread (see `purchase.sweeper`)
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name=_('user'),
+        related_name='idempotency_keys',
+    )
+    key = models.CharField(max_length=255, verbose_name=_('key'))
+    status_code = models.PositiveSmallIntegerField(
+        null=True, verbose_name=_('status code')
+    )
+    response = models.JSONField(null=True, verbose_name=_('response'))
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name=_('date of creation')
+    )
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('idempotency key')
+        verbose_name_plural = _('idempotency keys')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'key'), name='idempotency_key_user_key'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('created_at',), name='idempotency_key_created'
+            ),
+        )
+
+    @property
+    def is_completed(self) -> bool:
+        return self.status_code is not None
+
+    def __str__(self):
+        return f'{self.user_id}: {self.key}'
+
+
+class CartItem(models.Model):
+    """Product in cart of authenticated user (see `purchase.cart`)"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name=_('user'),
+        related_name='cart_items',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        verbose_name=_('product'),
+        related_name='cart_items',
+    )
+    count = models.PositiveIntegerField(default=1, verbose_name=_('quantity'))
+
+    class Meta:
+        verbose_name = _('product in cart')
+        verbose_name_plural = _('products in cart')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'product'), name='cart_item_user_product'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.product_id} x{self.count}'
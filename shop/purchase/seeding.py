@@ -0,0 +1,343 @@
+"""
+This module contains deterministic generator of synthetic shop data
+for load testing (see `manage.py seedshop`).
+
+Rows are created with `bulk_create` in batches and get explicit primary
+keys following the existing ones, so related rows of other batches
+are referenced without reading them back and batches can be created
+by several processes at once.
+Every batch has its own random generator seeded with the seed,
+the kind of rows and the number of the batch, so the same options
+give the same data whatever the amount of processes is.
+
+`bulk_create` doesn't send signals, so review stats, search documents
+and costs of orders are recalculated by each batch, category tree
+and amounts of products of categories are rebuilt at the end.
+"""
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from accounts.models import Profile
+from catalog.models import (
+    Category,
+    CategoryClosure,
+    Product,
+    ProductImage,
+    ProductOffer,
+    Review,
+    Specification,
+    Tag,
+)
+from catalog.search import update_search_documents
+from purchase.models import DeliveryType, Order, OrderItem
+
+ORDER_STATUSES = ('accepted', 'awaiting payment', 'paid', 'delivered')
+IMAGES = (
+    'fixtures/images/notebook.png',
+    'fixtures/images/products/headphones/1439947_v02_b.jpg',
+    'fixtures/images/products/audio/1451246_v02_b.jpg',
+)
+PASSWORD = '123456'
+
+
+class ShopSeeder:
+    """
+    Generator of categories, tags, specifications, products
+    (with images, reviews and offers), users with profiles
+    and orders with items
+    """
+    # models whose rows get explicit primary keys
+    models = (Category, Tag, Specification, Product, User, Profile, Order)
+
+    def __init__(
+        self,
+        seed: int = 0,
+        categories: int = 0,
+        tags: int = 0,
+        specifications: int = 0,
+        products: int = 0,
+        users: int = 0,
+        orders: int = 0,
+        images: int = 2,
+        reviews: int = 3,
+        items: int = 10,
+        offers: float = 0.1,
+        batch_size: int = 5000,
+    ):
+        self.seed = seed
+        self.amounts = {
+            Category: categories,
+            Tag: tags,
+            Specification: specifications,
+            Product: products,
+            User: users,
+            Profile: users,
+            Order: orders,
+        }
+        self.images = images
+        self.reviews = reviews
+        self.items = items
+        self.offers = offers
+        self.batch_size = batch_size
+        self.today = timezone.localdate()
+        self.password = make_password(PASSWORD)
+        # first primary key of generated rows of each model
+        self.starts = {
+            model: (model.objects.aggregate(last=models.Max('pk'))['last']
+                    or 0) + 1
+            for model in self.models
+        }
+        self.delivery_types = list(
+            DeliveryType.objects.order_by('pk').values_list('pk', flat=True)
+        )
+
+    def get_ids(self, model) -> range:
+        """Return primary keys of generated rows of the model"""
+        return range(
+            self.starts[model], self.starts[model] + self.amounts[model]
+        )
+
+    def get_batch_ids(self, model, batch: int) -> range:
+        return self.get_ids(model)[
+            batch * self.batch_size:(batch + 1) * self.batch_size
+        ]
+
+    def get_batches(self, model) -> range:
+        return range(-(-self.amounts[model] // self.batch_size))
+
+    def get_random(self, kind: str, batch: int = 0) -> random.Random:
+        return random.Random(f'{self.seed}:{kind}:{batch}')
+
+    def get_price(self, product_id: int) -> Decimal:
+        """Return price of generated product, it is a function of its id"""
+        cents = (product_id * 2654435761 + self.seed) % 99901 + 99
+        return Decimal(cents).scaleb(-2)
+
+    @transaction.atomic
+    def seed_taxonomy(self) -> None:
+        """Create categories with subcategories, tags and specifications"""
+        rnd = self.get_random('taxonomy')
+        category_ids = self.get_ids(Category)
+        Category.objects.bulk_create(
+            (
+                Category(
+                    pk=pk,
+                    title=f'Category {pk}',
+                    picture=f'fixtures/images/departments/{pk % 12 + 1}.svg',
+                )
+                for pk in category_ids
+            ),
+            batch_size=self.batch_size,
+        )
+        # every tenth category is a root, others are subcategories
+        # of one of previous categories
+        Category.subcategories.through.objects.bulk_create(
+            (
+                Category.subcategories.through(
+                    from_category_id=rnd.choice(category_ids[:index]),
+                    to_category_id=pk,
+                )
+                for index, pk in enumerate(category_ids) if index % 10
+            ),
+            batch_size=self.batch_size,
+        )
+        Tag.objects.bulk_create(
+            (Tag(pk=pk, name=f'tag {pk}') for pk in self.get_ids(Tag)),
+            batch_size=self.batch_size,
+        )
+        Specification.objects.bulk_create(
+            (
+                Specification(
+                    pk=pk, name=f'property {pk % 20}', value=f'value {pk}'
+                )
+                for pk in self.get_ids(Specification)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    @transaction.atomic
+    def seed_products(self, batch: int) -> None:
+        """
+        Create batch of products with tags, specifications, images,
+        reviews and offers, update their review stats and search documents
+        """
+        rnd = self.get_random('products', batch)
+        product_ids = self.get_batch_ids(Product, batch)
+        category_ids = self.get_ids(Category)
+        tag_ids = self.get_ids(Tag)
+        specification_ids = self.get_ids(Specification)
+
+        products, tags, specifications = [], [], []
+        images, reviews, offers = [], [], []
+        for pk in product_ids:
+            price = self.get_price(pk)
+            products.append(Product(
+                pk=pk,
+                title=f'Product {pk}',
+                slug=f'product-{pk}',
+                category_id=rnd.choice(category_ids),
+                price=price,
+                stock=rnd.randint(0, 100),
+                fullDescription=f'Description of product {pk}',
+                freeDelivery=rnd.random() < 0.2,
+                is_limited=rnd.random() < 0.1,
+                is_active=rnd.random() < 0.95,
+            ))
+            tags.extend(
+                Product.tags.through(product_id=pk, tag_id=tag_id)
+                for tag_id in rnd.sample(tag_ids, min(3, len(tag_ids)))
+            )
+            specifications.extend(
+                Product.specifications.through(
+                    product_id=pk, specification_id=specification_id
+                )
+                for specification_id in rnd.sample(
+                    specification_ids, min(3, len(specification_ids))
+                )
+            )
+            images.extend(
+                ProductImage(product_id=pk, image=rnd.choice(IMAGES))
+                for _ in range(rnd.randint(0, self.images))
+            )
+            reviews.extend(
+                Review(
+                    product_id=pk,
+                    author=f'user {rnd.randint(1, 1000)}',
+                    text=f'Review of product {pk}',
+                    rate=rnd.randint(1, 5),
+                )
+                for _ in range(rnd.randint(0, self.reviews))
+            )
+            if rnd.random() < self.offers:
+                offers.append(ProductOffer(
+                    product_id=pk,
+                    salePrice=(price * Decimal('0.8')).quantize(price),
+                    dateFrom=self.today - timedelta(days=rnd.randint(0, 10)),
+                    dateTo=self.today + timedelta(days=rnd.randint(0, 30)),
+                ))
+
+        for model, rows in (
+            (Product, products),
+            (Product.tags.through, tags),
+            (Product.specifications.through, specifications),
+            (ProductImage, images),
+            (Review, reviews),
+            (ProductOffer, offers),
+        ):
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+        products = Product.objects.filter(
+            pk__gte=product_ids.start, pk__lt=product_ids.stop
+        )
+        products.rebuild_review_stats()
+        update_search_documents(product_ids, self.batch_size)
+
+    @transaction.atomic
+    def seed_users(self, batch: int) -> None:
+        """Create batch of users with profiles"""
+        user_ids = self.get_batch_ids(User, batch)
+        profile_ids = self.get_batch_ids(Profile, batch)
+        User.objects.bulk_create(
+            User(
+                pk=pk,
+                username=f'user{pk}',
+                email=f'user{pk}@example.com',
+                password=self.password,
+            )
+            for pk in user_ids
+        )
+        Profile.objects.bulk_create(
+            Profile(pk=pk, user_id=user_id)
+            for pk, user_id in zip(profile_ids, user_ids)
+        )
+
+    @transaction.atomic
+    def seed_orders(self, batch: int) -> None:
+        """Create batch of orders with items and calculate their costs"""
+        rnd = self.get_random('orders', batch)
+        order_ids = self.get_batch_ids(Order, batch)
+        profile_ids = self.get_ids(Profile)
+        product_ids = self.get_ids(Product)
+
+        orders, items = [], []
+        for pk in order_ids:
+            orders.append(Order(
+                pk=pk,
+                buyer_id=rnd.choice(profile_ids),
+                deliveryType_id=rnd.choice(self.delivery_types),
+                status=rnd.choice(ORDER_STATUSES),
+                city='Moscow',
+                address=f'Street {pk % 1000}',
+            ))
+            amount = min(rnd.randint(1, self.items), len(product_ids))
+            items.extend(
+                OrderItem(
+                    order_id=pk,
+                    product_id=product_id,
+                    quantity=rnd.randint(1, 3),
+                    price=self.get_price(product_id),
+                )
+                for product_id in rnd.sample(product_ids, amount)
+            )
+        Order.objects.bulk_create(orders, batch_size=self.batch_size)
+        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        Order.objects.filter(
+            pk__gte=order_ids.start, pk__lt=order_ids.stop
+        ).update_costs()
+
+    def run(self, workers: int = 1) -> None:
+        """Create all rows, batches are created by given amount of processes"""
+        self.seed_taxonomy()
+        for method, model in (
+            ('seed_products', Product),
+            ('seed_users', User),
+            ('seed_orders', Order),
+        ):
+            self.run_batches(method, self.get_batches(model), workers)
+
+        CategoryClosure.objects.rebuild()
+        Category.objects.update_products_count()
+        Product.objects.rebuild_purchases()
+        self.reset_sequences()
+
+    def run_batches(self, method: str, batches: range, workers: int) -> None:
+        if workers <= 1:
+            for batch in batches:
+                getattr(self, method)(batch)
+            return
+
+        # connections can't be shared by processes
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            futures = [
+                pool.submit(run_batch, self, method, batch)
+                for batch in batches
+            ]
+            for future in futures:
+                future.result()
+
+    def reset_sequences(self) -> None:
+        """Move sequences of primary keys past the explicit ones"""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), self.models
+            ):
+                cursor.execute(sql)
+
+
+def run_batch(seeder: ShopSeeder, method: str, batch: int) -> None:
+    """Create batch in worker process"""
+    try:
+        getattr(seeder, method)(batch)
+    finally:
+        connections.close_all()
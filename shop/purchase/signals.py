@@ -0,0 +1,72 @@
+"""
+This module contains signal receivers which keep up to date
+stored costs of orders (`items_cost`, `delivery_cost`, `total_cost`),
+amounts of purchases of products (`purchases_count`)
+and merge session cart into database cart on login
+"""
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from catalog.models import Product
+from purchase.cart import Cart, DatabaseCart
+from purchase.models import Order, OrderItem
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_costs(sender, instance: OrderItem, raw=False, **kwargs):
+    """Recalculate costs of the order of saved or deleted purchase"""
+    if not raw:
+        Order.objects.filter(pk=instance.order_id).update_costs()
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_stored_purchase(sender, instance: OrderItem, raw=False, **kwargs):
+    """Remember product and quantity of the purchase as they are in database"""
+    instance._stored = None
+    if raw or instance.pk is None:
+        return
+
+    instance._stored = (
+        OrderItem.objects
+        .select_for_update()
+        .filter(pk=instance.pk)
+        .values_list('product_id', 'quantity')
+        .first()
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def update_purchases_on_save(sender, instance: OrderItem, raw=False, **kwargs):
+    """Apply created or edited purchase to amounts of purchases of products"""
+    if raw:
+        return
+
+    quantities = {instance.product_id: instance.quantity}
+    if stored := getattr(instance, '_stored', None):
+        stored_product_id, stored_quantity = stored
+        quantities[stored_product_id] = (
+            quantities.get(stored_product_id, 0) - stored_quantity
+        )
+    Product.objects.add_purchases(
+        {pk: quantity for pk, quantity in quantities.items() if quantity}
+    )
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_purchases_on_delete(sender, instance: OrderItem, **kwargs):
+    """Remove deleted purchase from amount of purchases of the product"""
+    Product.objects.add_purchases({instance.product_id: -instance.quantity})
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    """Move products from session cart into cart of logged in user"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    session_cart = Cart(request)
+    if counts := session_cart.get_counts():
+        DatabaseCart(user).merge(counts)
+    session_cart.clear()
@@ -0,0 +1,57 @@
+"""
+This module contains in-process sweeper of expired stock reservations
+and idempotency keys, it is started by `purchase.apps.PurchaseConfig` if
+`settings.STOCK_RESERVATION_SWEEP_INTERVAL` is set.
+Several processes could run sweepers at once, as releasing and purging
+are idempotent DELETEs
+"""
+
+import logging
+import threading
+
+from django.db import close_old_connections
+
+from purchase.models import IdempotencyKey, StockReservation
+
+logger = logging.getLogger(__name__)
+
+_sweeper = None
+
+
+def sweep() -> int:
+    """
+    Release expired stock reservations and purge expired idempotency keys,
+    return amount of released reservations
+    """
+    close_old_connections()
+    try:
+        IdempotencyKey.objects.purge()
+        return StockReservation.objects.release_expired()
+    finally:
+        close_old_connections()
+
+
+def run(interval: float, stopped: threading.Event) -> None:
+    while not stopped.wait(interval):
+        try:
+            sweep()
+        except Exception:
+            logger.exception('Failed to release expired records')
+
+
+def start_sweeper(interval: float) -> threading.Event:
+    """
+    Start daemon thread releasing expired records every `interval`
+    seconds (once per process), return event stopping it
+    """
+    global _sweeper
+    if _sweeper is None:
+        stopped = threading.Event()
+        threading.Thread(
+            target=run,
+            args=(interval, stopped),
+            name='stock-reservation-sweeper',
+            daemon=True,
+        ).start()
+        _sweeper = stopped
+    return _sweeper